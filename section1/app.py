@@ -1,13 +1,14 @@
 """ EXTERNAL MODULES """
 import os
 import re
+import click
 from flask import Flask, jsonify, session
 from flask_cors import CORS
 from flask_restful import Api
 from flask_jwt_extended import JWTManager
 
 """ INTERNAL MODULES """
-from db import db
+from db import db, ensure_schema, is_schema_current
 from resources.user import UserRegister, User, UserLogin, UserLogout, TokenRefresh
 from resources.item import Item, ItemList
 from resources.store import Store, StoreList
@@ -35,12 +36,23 @@ CORS(app)
 api = Api(app)
 db.init_app(app)
 
-# Create the DB
-@app.before_first_request
-def create_tables():
-    UserModel.__table__.create(db.session.bind, checkfirst=True)
-    StoreModel.__table__.create(db.session.bind, checkfirst=True)
-    ItemModel.__table__.create(db.session.bind, checkfirst=True)
+
+# The DB is created by `flask init-db` (see gunicorn.conf.py), not on the first request.
+@app.cli.command("init-db")
+def init_db():
+    """ Create the database tables. Run once per deploy, before the workers start serving. """
+    if ensure_schema():
+        click.echo("Database tables created.")
+    else:
+        click.echo("Database schema is already current.")
+
+
+@app.cli.command("check-db")
+def check_db():
+    """ Exit with status 1 if the database schema is not current. """
+    if not is_schema_current():
+        raise click.ClickException("Database schema is not current, run `flask init-db`.")
+    click.echo("Database schema is current.")
 
 
 jwt = JWTManager(app)  # this will not create a new endpoint called "/auth"
@@ -63,4 +75,6 @@ api.add_resource(User, "/api/user/<int:user_id>")
 api.add_resource(TokenRefresh, "/refresh")
 
 if __name__ == "__main__":
+    with app.app_context():
+        ensure_schema()
     app.run(port=6000, debug=True)
@@ -1,3 +1,20 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import inspect
 
 db = SQLAlchemy()
+
+
+def is_schema_current() -> bool:
+    """ Whether the database has a table for every model, found with a single query. """
+    return set(db.metadata.tables) <= set(inspect(db.engine).get_table_names())
+
+
+def ensure_schema() -> bool:
+    """
+    Create any missing tables; returns whether there were some. Run once per deploy (`flask init-db`, or the gunicorn
+    `on_starting` hook) rather than on the first request of every worker.
+    """
+    if is_schema_current():
+        return False
+    db.create_all()
+    return True
@@ -0,0 +1,11 @@
+import subprocess
+import sys
+
+
+def on_starting(server):
+    """
+    Runs once in the gunicorn master, before any worker is forked: bring the database schema up to date here, so
+    that no worker pays for it on its first request. It runs as `flask init-db` in a separate process, so the master
+    does not import the app and hand its connections and threads down to the forked workers.
+    """
+    subprocess.run([sys.executable, "-m", "flask", "init-db"], check=True)
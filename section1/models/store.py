@@ -1,4 +1,5 @@
 from typing import Dict, List, Union
+from sqlalchemy.orm import selectinload
 from db import db
 from models.item import ItemJSON
 
@@ -12,8 +13,8 @@ class StoreModel(db.Model):
     name = db.Column(db.String(100), unique=True)
 
     items = db.relationship(
-        "ItemModel", lazy="dynamic"
-    )  # lazy="dynamic" turns the object into a query builder
+        "ItemModel"
+    )  # a plain list, so it can be eager-loaded together with the store
 
     def __init__(self, name: str):
         self.name = name
@@ -22,7 +23,7 @@ class StoreModel(db.Model):
         return {
             "id": self.id,
             "name": self.name,
-            "items": [item.json() for item in self.items.all()],
+            "items": [item.json() for item in self.items],
         }
 
     @classmethod
@@ -31,10 +32,22 @@ class StoreModel(db.Model):
             name=name
         ).first()  # SELECT * FROM item WHERE name=name LIMIT 1
 
+    @classmethod
+    def find_by_name_with_items(cls, name: str) -> "StoreModel":
+        return (
+            cls.query.options(selectinload(cls.items)).filter_by(name=name).first()
+        )
+
     @classmethod
     def find_all(cls) -> List["StoreModel"]:
         return cls.query.all()
 
+    @classmethod
+    def find_all_with_items(cls) -> List["StoreModel"]:
+        return cls.query.options(
+            selectinload(cls.items)
+        ).all()  # SELECT * FROM stores + SELECT * FROM items WHERE store_id IN (...)
+
     def save_to_db(self) -> None:
         db.session.add(self)
         db.session.commit()
@@ -10,7 +10,7 @@ ERROR_INSERTING = "An error occured when inserting a store."
 class Store(Resource):
     @classmethod
     def get(cls, name: str):
-        store = StoreModel.find_by_name(name)
+        store = StoreModel.find_by_name_with_items(name)
         if store:
             return store.json()
         return {"message": STORE_NOT_FOUND}, 404
@@ -41,4 +41,4 @@ class Store(Resource):
 class StoreList(Resource):
     @classmethod
     def get(cls):
-        return [store.json() for store in StoreModel.find_all()]
+        return [store.json() for store in StoreModel.find_all_with_items()]
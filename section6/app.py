@@ -1,23 +1,33 @@
 import os
+import click
 from dotenv import load_dotenv
 from flask import Flask, jsonify
 from flask_cors import CORS
 from flask_restful import Api
 from flask_jwt_extended import JWTManager
+from flask_migrate import Migrate
 from flask_uploads import configure_uploads
 from marshmallow import ValidationError
 from ma import ma
-from db import db
+from db import db, ensure_schema, is_schema_current
 from resources.user import (UserRegister, User, UserLogin, UserLogout, TokenRefresh)
 from resources.item import Item, ItemList
 from resources.store import Store, StoreList
 from resources.confirmation import Confirmation, ConfirmationByUser
-from resources.image import ImageUpload, Image, AvatarUpload, Avatar
+from resources.image import ImageUpload, Image, AvatarUpload, Avatar, UploadSessionList, UploadSession
+from libs import image_helper, passwords
+from libs.blob_store import blob_store
+from libs.blob_sweeper import blob_sweeper
 from libs.image_helper import IMAGE_SET
+from libs.image_variants import image_variants
+from libs.outbox_worker import OutboxWorker
 from models.user import UserModel
 from models.item import ItemModel
 from models.store import StoreModel
 from models.confirmation import ConfirmationModel
+from models.email_outbox import EmailOutboxModel
+from models.upload_session import UploadSessionModel
+from models.image import ImageRefModel
 from blocklist import BLOCKLIST
 
 uri = os.getenv("DATABASE_URL") or "sqlite:///data.db"  # or other relevant config var
@@ -30,20 +40,86 @@ load_dotenv(".env", verbose=True)
 app.config.from_object("default_config")
 app.config.from_envvar("APPLICATION_SETTINGS")
 configure_uploads(app, IMAGE_SET)
+image_variants.init_app(app)
+blob_store.init_app(app)
+blob_sweeper.init_app(app)
 CORS(app)
 # app.secret_key = "rc"
 api = Api(app)
 db.init_app(app)
 ma.init_app(app)
+migrate = Migrate(app, db)
+passwords.init_app(app)
+outbox_worker = OutboxWorker(app, workers=app.config["EMAIL_OUTBOX_WORKERS"])
 
 
-# Create the DB
+# The DB is created by `flask init-db` (see gunicorn.conf.py), not on the first request.
 @app.before_first_request
-def create_tables():
-    UserModel.__table__.create(db.session.bind, checkfirst=True)
-    StoreModel.__table__.create(db.session.bind, checkfirst=True)
-    ItemModel.__table__.create(db.session.bind, checkfirst=True)
-    ConfirmationModel.__table__.create(db.session.bind, checkfirst=True)
+def start_background_threads():
+    # in each worker process, threads do not survive a fork
+    outbox_worker.start()
+    blob_sweeper.start()
+
+
+@app.cli.command("init-db")
+def init_db():
+    """ Apply the database migrations. Run once per deploy, before the workers start serving. """
+    if ensure_schema():
+        click.echo("Database migrations applied.")
+    else:
+        click.echo("Database schema is already current.")
+
+
+@app.cli.command("check-db")
+def check_db():
+    """ Exit with status 1 if the database schema is not current. """
+    if not is_schema_current():
+        raise click.ClickException("Database schema is not current, run `flask init-db`.")
+    click.echo("Database schema is current.")
+
+
+@app.cli.command("rebuild-avatar-index")
+def rebuild_avatar_index():
+    """ Recompute every user's avatar from the files in static/images/avatars, scanning the folder once. """
+    avatars = image_helper.scan_avatars("avatars")
+    UserModel.replace_avatars(avatars)
+    click.echo(f"Indexed {len(avatars)} avatars.")
+
+
+@app.cli.command("store-legacy-images")
+def store_legacy_images():
+    """ Move the images uploaded before blob storage, from static/images/user_<id>, into the blob store. """
+    stored = 0
+    for folder in os.scandir(IMAGE_SET.config.destination):
+        user_id = folder.name[len("user_"):]
+        if not (folder.is_dir() and folder.name.startswith("user_") and user_id.isdigit()):
+            continue
+        for image in os.scandir(folder.path):
+            if image.is_file() and image_helper.is_filename_safe(image.name):
+                digest, size, temporary = blob_store.write_file(image.path)
+                try:
+                    ImageRefModel.add(int(user_id), image.name, digest, size)
+                except:
+                    blob_store.put_back(temporary, image.path)  # left for the next run
+                    raise
+                blob_store.keep(temporary, digest)
+                stored += 1
+    click.echo(f"Stored {stored} images.")
+
+
+@app.cli.command("drop-lost-images")
+@click.option("--yes", is_flag=True, help="Delete the images, instead of only counting them.")
+def drop_lost_images(yes):
+    """
+    Delete the images whose blob file is gone, left by a crash while storing them (see libs.blob_store).
+    Check the count first: if most files are missing, the images folder is more likely not mounted than lost.
+    """
+    lost, referenced = blob_sweeper.find_lost_blobs()
+    click.echo(f"{len(lost)} of {referenced} stored files are missing.")
+    if lost and yes:
+        click.echo(f"Deleted the images of {blob_sweeper.drop_lost_blobs(lost)} files.")
+    elif lost:
+        click.echo("Run again with --yes to delete their images.")
 
 
 @app.errorhandler(ValidationError)
@@ -74,6 +150,10 @@ api.add_resource(ImageUpload, "/api/upload/image")
 api.add_resource(Image, "/api/image/<string:filename>")
 api.add_resource(AvatarUpload, "/api/upload/avatar")
 api.add_resource(Avatar, "/api/avatar/<int:user_id>")
+api.add_resource(UploadSessionList, "/api/upload/sessions")
+api.add_resource(UploadSession, "/api/upload/sessions/<string:upload_id>")
 
 if __name__ == "__main__":
+    with app.app_context():
+        ensure_schema()
     app.run(port=6000, debug=True)
@@ -1,3 +1,57 @@
+from typing import Optional, Set
+
+import flask_migrate
+from alembic.script import ScriptDirectory
+from flask import current_app
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import MetaData, inspect, text
+from sqlalchemy.exc import OperationalError, ProgrammingError
+
+convention = {
+    "ix": "ix_%(column_0_label)s",
+    "uq": "uq_%(table_name)s_%(column_0_name)s",
+    "ck": "ck_%(table_name)s_%(constraint_name)s",
+    "fk": "fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s",
+    "pk": "pk_%(table_name)s"
+}
+
+metadata = MetaData(naming_convention=convention)
+db = SQLAlchemy(metadata=metadata)
+
+
+INITIAL_REVISION = "d5aea963c7d1"  # the schema create_all() used to build, before migrations
+
+
+def _migration_heads() -> Set[str]:
+    config = current_app.extensions["migrate"].migrate.get_config()
+    return set(ScriptDirectory.from_config(config).get_heads())
+
+
+def _database_revisions() -> Optional[Set[str]]:
+    """ The revisions the database is at, or None if it has never been migrated. """
+    try:
+        return {row[0] for row in db.session.execute(text("SELECT version_num FROM alembic_version"))}
+    except (OperationalError, ProgrammingError):  # no alembic_version table yet
+        db.session.rollback()
+        return None
+
+
+def is_schema_current() -> bool:
+    """ Whether the database has had every migration applied, found with a single query. """
+    return _database_revisions() == _migration_heads()
+
 
-db = SQLAlchemy()
+def ensure_schema() -> bool:
+    """
+    Apply any pending migrations; returns whether there were some. Run once per deploy (`flask init-db`, or the
+    gunicorn `on_starting` hook) rather than on the first request of every worker.
+    A database created by create_all() before there were migrations is stamped with the initial revision first.
+    """
+    revisions = _database_revisions()
+    if revisions == _migration_heads():
+        return False
+    if revisions is None and set(db.metadata.tables) & set(inspect(db.engine).get_table_names()):
+        flask_migrate.stamp(revision=INITIAL_REVISION)
+    db.session.remove()
+    flask_migrate.upgrade()
+    return True
@@ -9,3 +9,20 @@ SECRET_KEY = os.environ["APP_SECRET_KEY"]
 UPLOADED_IMAGES_DEST = os.path.join("static", "images")
 JWT_BLACKLIST_ENABLED = True
 JWT_BLACKLIST_TOKEN_CHECKS = ["access", "refresh"]
+EMAIL_OUTBOX_WORKERS = 4
+PASSWORD_SCRYPT_N = 2 ** 14  # scrypt cost; raising it rehashes each password on its next login
+PASSWORD_POOL_WORKERS = 2  # threads hashing passwords
+PASSWORD_POOL_QUEUE = 6  # logins allowed to wait for one of them before returning 503
+MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # bytes; werkzeug rejects bigger requests before reading them
+IMAGE_MAX_SIZE = 10 * 1024 * 1024  # bytes, per image
+IMAGE_USER_QUOTA = 200 * 1024 * 1024  # bytes, per user
+IMAGE_UPLOAD_CHUNK_SIZE = 64 * 1024  # resumable uploads are written to disk this many bytes at a time
+IMAGE_UPLOAD_SESSION_TTL = 24 * 3600  # seconds to finish a resumable upload
+IMAGE_UPLOAD_TEMP_FOLDER = "upload_sessions"  # outside static/, where unfinished uploads would be served
+IMAGE_BLOB_SWEEP_INTERVAL = 300  # seconds between deletions of unreferenced image blobs, besides after each delete
+IMAGE_BLOB_TEMP_MAX_AGE = 3600  # seconds after which a blob's temporary file is taken as left behind by a crash
+IMAGE_VARIANT_WORKERS = 2  # threads resizing uploaded images, see libs.image_variants
+IMAGE_CACHE_MAX_AGE = 3600  # seconds a client may reuse an image before revalidating it with its ETag
+AVATAR_CACHE_MAX_AGE = 300  # shorter, as an avatar is replaced under the same URL
+USE_X_SENDFILE = False  # let Apache/lighttpd send the files from send_file, images included (X-Sendfile)
+IMAGE_X_ACCEL_REDIRECT = None  # or let nginx send them, from this internal location, e.g. "/protected-images"
@@ -0,0 +1,139 @@
+"""
+libs.blob_store
+
+Content-addressed storage for uploaded images. Each distinct file is stored once, in the 'blobs' folder of
+UPLOADED_IMAGES_DEST, named after the SHA-256 of its content; `models.image` keeps which users reference it, and under
+which file names.
+
+Storing an upload is done in three steps:
+    digest, size, temporary = blob_store.write(stream)      # hashed while it is copied to a temporary file
+    ImageRefModel.add(user_id, filename, digest, size)       # commit the reference
+    blob_store.keep(temporary, digest)                       # move it into place, unless the blob was already there
+Between the last two, a reference exists whose blob file is still in the 'tmp' folder, named after its digest. If the
+process dies there, the file is left behind: `libs.blob_sweeper` moves such files into place once they are older than
+IMAGE_BLOB_TEMP_MAX_AGE, and deletes the other old temporary files; `flask drop-lost-images` drops the references to
+blobs whose file is gone. The sweeper also deletes the blobs nobody references any more.
+"""
+import hashlib
+import os
+import shutil
+import threading
+import time
+import uuid
+from typing import BinaryIO, Iterator, Optional, Tuple
+
+BLOBS_FOLDER = "blobs"
+CHUNK_SIZE = 64 * 1024
+HEX_DIGEST_LENGTH = 64  # of a SHA-256
+
+
+class BlobStore:
+    def __init__(self):
+        self.directory = os.path.join("static", "images", BLOBS_FOLDER)
+
+    def init_app(self, app) -> None:
+        self.directory = os.path.join(app.config["UPLOADED_IMAGES_DEST"], BLOBS_FOLDER)
+        os.makedirs(os.path.join(self.directory, "tmp"), exist_ok=True)
+
+    def path(self, digest: str) -> str:
+        return os.path.join(self.directory, digest[:2], digest)  # spread over 256 folders
+
+    def _temporary_path(self, prefix: str) -> str:
+        name = f"{prefix}.{os.getpid()}.{threading.get_ident()}.{uuid.uuid4().hex}"
+        return os.path.join(self.directory, "tmp", name)
+
+    def write(self, stream: BinaryIO) -> Tuple[str, int, str]:
+        """ Copy the stream to a temporary file, hashing it on the way; returns (digest, size, temporary path). """
+        writing = self._temporary_path("writing")
+        content_hash = hashlib.sha256()
+        size = 0
+        with open(writing, "wb") as f:
+            for chunk in iter(lambda: stream.read(CHUNK_SIZE), b""):
+                content_hash.update(chunk)
+                f.write(chunk)
+                size += len(chunk)
+        digest = content_hash.hexdigest()
+        temporary = self._temporary_path(digest)
+        os.replace(writing, temporary)
+        return digest, size, temporary
+
+    def write_file(self, path: str) -> Tuple[str, int, str]:
+        """ Like write, for a file already on disk, which is moved rather than copied. """
+        content_hash = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                content_hash.update(chunk)
+        digest = content_hash.hexdigest()
+        temporary = self._temporary_path(digest)
+        shutil.move(path, temporary)  # the file may be on another file system
+        os.utime(temporary)  # its age is how the sweeper tells a left-behind file from one being stored
+        return digest, os.path.getsize(temporary), temporary
+
+    def keep(self, temporary: str, digest: str) -> None:
+        """ Move a written file into place, once its reference is committed, or drop it if the blob exists. """
+        path = self.path(digest)
+        if os.path.exists(path):
+            os.remove(temporary)
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(temporary, path)
+
+    def discard(self, temporary: str) -> None:
+        """ Drop a written file whose reference could not be committed. """
+        try:
+            os.remove(temporary)
+        except FileNotFoundError:
+            pass
+
+    def put_back(self, temporary: str, path: str) -> None:
+        """ Move a file written by write_file back where it came from, when its reference could not be committed. """
+        shutil.move(temporary, path)
+
+    def exists(self, digest: str) -> bool:
+        """ Whether the blob's file is in place, or only set aside by the sweeper for now. """
+        return os.path.exists(self.path(digest)) or os.path.exists(self._tombstone_path(digest))
+
+    def temporaries(self, max_age: float = 0) -> Iterator[Tuple[Optional[str], str]]:
+        """ (digest, path) of the temporary files older than `max_age` seconds; digest is None while one is written. """
+        oldest = time.time() - max_age
+        for entry in os.scandir(os.path.join(self.directory, "tmp")):
+            try:
+                if entry.stat().st_mtime > oldest:
+                    continue
+            except FileNotFoundError:  # kept or discarded since the folder was listed
+                continue
+            prefix = entry.name.split(".", 1)[0]
+            yield (prefix if len(prefix) == HEX_DIGEST_LENGTH else None), entry.path
+
+    def is_being_written(self, digest: str) -> bool:
+        """ Whether a temporary file with this content is waiting for its reference to be committed. """
+        return any(found == digest for found, _ in self.temporaries())
+
+    # Deleting a blob races with an upload of the same content, which may commit a new reference and find the file
+    # still there just before it is removed. So the sweeper first renames the file out of the way, then deletes the
+    # row only if it is still unreferenced: an upload committing before that sees the row kept and the file put back,
+    # and one committing after finds no file and moves its own copy into place.
+
+    def _tombstone_path(self, digest: str) -> str:
+        return f"{self.path(digest)}.deleting"
+
+    def tombstone(self, digest: str) -> None:
+        try:
+            os.replace(self.path(digest), self._tombstone_path(digest))
+        except FileNotFoundError:
+            pass
+
+    def restore(self, digest: str) -> None:
+        try:
+            os.replace(self._tombstone_path(digest), self.path(digest))
+        except FileNotFoundError:
+            pass
+
+    def remove_tombstone(self, digest: str) -> None:
+        try:
+            os.remove(self._tombstone_path(digest))
+        except FileNotFoundError:
+            pass
+
+
+blob_store = BlobStore()
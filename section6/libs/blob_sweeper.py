@@ -0,0 +1,134 @@
+"""
+libs.blob_sweeper
+
+Deletes the image blobs no upload references any more, from a background thread, so that deleting an image never
+waits on the file system. It sweeps every `interval` seconds, and straight away when woken by a delete.
+
+It also repairs what a process dying in the middle of storing an upload leaves behind (see libs.blob_store): on each
+sweep, the temporary files older than `temp_max_age`. On each sweep too, it deletes the resumable uploads that have
+expired, with the bytes they had received.
+The images whose blob file is gone are only deleted by `flask drop-lost-images`: an unmounted volume or a wrong
+UPLOADED_IMAGES_DEST looks just like every blob being lost.
+"""
+import os
+import threading
+import traceback
+from time import time
+from typing import List, Tuple
+
+from libs.blob_store import blob_store
+from libs.image_variants import DIGEST_LENGTH, image_variants
+from models.image import ImageBlobModel
+from models.upload_session import UploadSessionModel
+
+
+class BlobSweeper:
+    def __init__(self, interval: float = 300, batch_size: int = 100, temp_max_age: float = 3600):
+        self.app = None
+        self.interval = interval
+        self.batch_size = batch_size
+        self.temp_max_age = temp_max_age
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="blob-sweeper", daemon=True)
+
+    def init_app(self, app) -> None:
+        self.app = app
+        self.interval = app.config.get("IMAGE_BLOB_SWEEP_INTERVAL", self.interval)
+        self.temp_max_age = app.config.get("IMAGE_BLOB_TEMP_MAX_AGE", self.temp_max_age)
+
+    def start(self) -> None:
+        if not self._thread.is_alive():
+            self._thread.start()
+
+    def wake(self) -> None:
+        self._wake.set()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._wake.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            self._wake.clear()
+            try:
+                self.sweep_temporaries()
+                self.sweep_upload_sessions()
+                swept = self.sweep_once()
+            except Exception:
+                traceback.print_exc()
+                swept = 0
+            if swept < self.batch_size:  # nothing left to delete for now, keep going straight away otherwise
+                self._wake.wait(self.interval)
+
+    def sweep_once(self) -> int:
+        """ Delete one batch of unreferenced blobs; returns how many were found. """
+        with self.app.app_context():
+            digests = ImageBlobModel.find_unreferenced(self.batch_size)
+            for digest in digests:
+                blob_store.tombstone(digest)  # see libs.blob_store
+                if ImageBlobModel.delete_if_unreferenced(digest):
+                    blob_store.remove_tombstone(digest)
+                    image_variants.discard(digest[:DIGEST_LENGTH])
+                else:
+                    blob_store.restore(digest)
+        return len(digests)
+
+    def sweep_temporaries(self) -> None:
+        """ Move the old temporary files whose reference was committed into place, and delete the others. """
+        with self.app.app_context():
+            for digest, path in list(blob_store.temporaries(self.temp_max_age)):
+                if digest and ImageBlobModel.is_referenced(digest):
+                    blob_store.keep(path, digest)
+                else:
+                    blob_store.discard(path)
+
+    def sweep_upload_sessions(self) -> None:
+        """ Delete the expired upload sessions, then the .part files left without one (not written for a whole TTL). """
+        with self.app.app_context():
+            for upload in UploadSessionModel.find_expired(self.batch_size):
+                upload.discard()
+
+            folder = self.app.config["IMAGE_UPLOAD_TEMP_FOLDER"]
+            oldest = time() - self.app.config["IMAGE_UPLOAD_SESSION_TTL"]
+            if not os.path.isdir(folder):
+                return
+            for entry in os.scandir(folder):
+                try:
+                    if entry.name.endswith(".part") and entry.stat().st_mtime < oldest:
+                        os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+
+    def find_lost_blobs(self) -> Tuple[List[str], int]:
+        """ The referenced digests whose blob file is gone, and how many digests are referenced in all. """
+        lost, referenced = [], 0
+        with self.app.app_context():
+            after = ""
+            while True:
+                digests = ImageBlobModel.find_referenced(after, self.batch_size)
+                if not digests:
+                    return lost, referenced
+                referenced += len(digests)
+                lost.extend(digest for digest in digests if self._is_lost(digest))
+                after = digests[-1]
+
+    def drop_lost_blobs(self, digests: List[str]) -> int:
+        """ Delete the images of these lost blobs, which could never be sent; returns how many blobs were dropped. """
+        dropped = 0
+        with self.app.app_context():
+            for digest in digests:
+                if self._is_lost(digest) and ImageBlobModel.delete_with_references(
+                    digest, lambda: self._is_lost(digest)  # an upload of the same content may have just stored it
+                ):
+                    image_variants.discard(digest[:DIGEST_LENGTH])
+                    dropped += 1
+        return dropped
+
+    @staticmethod
+    def _is_lost(digest: str) -> bool:
+        return not (blob_store.exists(digest) or blob_store.is_being_written(digest))
+
+
+blob_sweeper = BlobSweeper()
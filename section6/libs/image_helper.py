@@ -1,11 +1,29 @@
+import mimetypes
 import os
 import re
-from typing import Union
+from typing import Dict, Union
+from urllib.parse import quote
+from flask import Response, current_app, send_file
 from werkzeug.datastructures import FileStorage
 from flask_uploads import UploadSet, IMAGES
 
 IMAGE_SET = UploadSet("images", IMAGES)  # set name and allowed extensions
 
+# How many of a file's first bytes is_image_content needs: every signature below fits in 16, but an SVG may have an XML
+# declaration, a doctype and comments before its <svg> tag
+HEAD_LENGTH = 4096
+
+# What the first bytes of each image format are, by extension
+_JPEG = (b"\xff\xd8\xff",)
+MAGIC_BYTES = {
+    "jpg": _JPEG,
+    "jpe": _JPEG,
+    "jpeg": _JPEG,
+    "png": (b"\x89PNG\r\n\x1a\n",),
+    "gif": (b"GIF87a", b"GIF89a"),
+    "bmp": (b"BM",),
+}
+
 
 def save_image(image: FileStorage, folder: str = None, name: str = None) -> str:
     """Takes FileStorage and saves it to a folder"""
@@ -17,14 +35,68 @@ def get_path(filename: str, folder: str) -> str:
     return IMAGE_SET.path(filename, folder)
 
 
-def find_image_any_format(filename: str, folder: str) -> Union[str, None]:
-    """Takes a filename and returns an image on any of the accepted formats"""
-    for _format in IMAGES:
-        image = f"{filename}.{_format}"
-        image_path = IMAGE_SET.path(filename=image, folder=folder)
-        if os.path.isfile(image_path):
-            return image_path
-    return None
+def send_image(path: str, max_age: int, private: bool = False, mimetype: str = None) -> Response:
+    """Send an image file, letting clients cache it for max_age seconds and revalidate it afterwards
+    Raises FileNotFoundError if there is no such file. mimetype is guessed from the path if not given.
+
+    send_file answers If-None-Match/If-Modified-Since with a 304 and Range with a 206, and lets the WSGI server
+    send the file with sendfile(). With USE_X_SENDFILE, or IMAGE_X_ACCEL_REDIRECT set to the internal nginx
+    location serving UPLOADED_IMAGES_DEST, the web server sends the file and the worker only sends headers.
+    """
+    accel_location = current_app.config.get("IMAGE_X_ACCEL_REDIRECT")
+    if accel_location:
+        os.stat(path)  # 404 here rather than from nginx
+        relative_path = os.path.relpath(path, IMAGE_SET.config.destination).replace(os.sep, "/")
+        mimetype = mimetype or mimetypes.guess_type(path)[0] or "application/octet-stream"
+        response = current_app.response_class(mimetype=mimetype)
+        response.headers["X-Accel-Redirect"] = f"{accel_location.rstrip('/')}/{quote(relative_path)}"
+        response.cache_control.max_age = max_age
+    else:
+        response = send_file(path, mimetype=mimetype, max_age=max_age, conditional=True, etag=True)
+
+    if private:  # only for the logged in user, never for a shared cache
+        response.cache_control.public = False
+        response.cache_control.private = True
+    else:
+        response.cache_control.public = True
+    return response
+
+
+def is_image_content(head: bytes, filename: str) -> bool:
+    """Check the first bytes of a file (HEAD_LENGTH of them) are those of the image format its extension claims
+    is_image_content(b"\\x89PNG\\r\\n\\x1a\\n...", "photo.png") returns True
+    """
+    ext = get_extension(filename)[1:].lower()
+    if ext == "webp":
+        return head[:4] == b"RIFF" and head[8:12] == b"WEBP"
+    if ext == "svg":
+        text = head.lstrip(b"\xef\xbb\xbf \t\r\n")
+        return text.startswith(b"<") and b"<svg" in head
+    return head.startswith(MAGIC_BYTES.get(ext, ()))
+
+
+def upload_temp_path(upload_id: str) -> str:
+    """Return where the bytes received so far by a resumable upload are kept"""
+    folder = current_app.config["IMAGE_UPLOAD_TEMP_FOLDER"]
+    os.makedirs(folder, exist_ok=True)
+    return os.path.join(folder, f"{upload_id}.part")
+
+
+def scan_avatars(folder: str) -> Dict[int, str]:
+    """Return the avatar file of each user found in the folder, by user ID
+    {1: "user_1.png"} for a folder containing "user_1.png"
+    """
+    newest = {}  # user ID -> (modified time, file name); a user with several files gets the latest upload
+    directory = IMAGE_SET.path(filename="", folder=folder)
+    if not os.path.isdir(directory):
+        return {}
+    for entry in os.scandir(directory):
+        match = re.match(r"^user_(\d+)\.[a-zA-Z0-9]+$", entry.name)
+        if match and entry.is_file() and is_filename_safe(entry.name):
+            user_id = int(match.group(1))
+            candidate = (entry.stat().st_mtime, entry.name)
+            newest[user_id] = max(newest.get(user_id, candidate), candidate)
+    return {user_id: name for user_id, (_, name) in newest.items()}
 
 
 def _retrieve_filename(file: Union[str, FileStorage]) -> str:
@@ -0,0 +1,155 @@
+"""
+libs.image_variants
+
+Resized WebP copies of the uploaded images, so that a client showing a thumbnail can ask for `?size=small` instead of
+downloading the original photo.
+
+Variants are stored in the 'variants' folder of UPLOADED_IMAGES_DEST, named after a hash of the original's content and
+the size: an image replaced under the same name gets new variants, and identical uploads share theirs.
+They are made on upload by a background thread pool, or on the first request for one that does not exist yet; requests
+arriving while a variant is being made wait for that resize instead of starting their own. An image Pillow cannot
+resize (SVG, a truncated file...) is served as it is.
+"""
+import hashlib
+import os
+import threading
+import traceback
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Tuple
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+SIZES = {"small": 128, "medium": 512, "large": 1280}  # longest side, in pixels
+WEBP_QUALITY = 80
+VARIANTS_FOLDER = "variants"
+DIGEST_LENGTH = 32  # hex characters of the SHA-256 kept in variant names
+DIGEST_CACHE_SIZE = 4096  # images whose content hash is remembered
+
+
+class ImageVariants:
+    def __init__(self, workers: int = 2):
+        self.directory = os.path.join("static", "images", VARIANTS_FOLDER)
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="image-variants")
+        self._in_flight: Dict[str, Future] = {}  # variant path -> the resize making it
+        self._lock = threading.Lock()
+        # original path -> (mtime, size, content hash), least recently used first
+        self._digests: "OrderedDict[str, Tuple[float, int, str]]" = OrderedDict()
+
+    def init_app(self, app) -> None:
+        self.directory = os.path.join(app.config["UPLOADED_IMAGES_DEST"], VARIANTS_FOLDER)
+        os.makedirs(self.directory, exist_ok=True)
+        workers = app.config.get("IMAGE_VARIANT_WORKERS", 2)
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="image-variants")
+
+    def digest(self, path: str) -> str:
+        """ Hash of the file's content, only read again when its modification time or size changes. """
+        stat = os.stat(path)
+        with self._lock:
+            cached = self._digests.get(path)
+            if cached and cached[:2] == (stat.st_mtime, stat.st_size):
+                self._digests.move_to_end(path)
+                return cached[2]
+
+        content_hash = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(64 * 1024), b""):
+                content_hash.update(chunk)
+        digest = content_hash.hexdigest()[:DIGEST_LENGTH]
+        with self._lock:
+            self._digests[path] = (stat.st_mtime, stat.st_size, digest)
+            self._digests.move_to_end(path)
+            if len(self._digests) > DIGEST_CACHE_SIZE:
+                self._digests.popitem(last=False)
+        return digest
+
+    def variant_path(self, digest: str, size: str) -> str:
+        return os.path.join(self.directory, f"{digest}_{size}.webp")
+
+    def get(self, path: str, size: str) -> str:
+        """
+        Return the path of the `size` variant of the image at `path`, making it first if need be.
+        Images Pillow cannot read (SVG...) have no variants: their own path is returned.
+        Raises FileNotFoundError if there is no image at `path`.
+        """
+        target = self.variant_path(self.digest(path), size)
+        if os.path.exists(target):
+            return target
+        return self._submit(path, target, SIZES[size]).result()
+
+    def discard(self, digest: str) -> None:
+        """ Delete the variants of the content with this digest, when no image has it any more. """
+        for size in SIZES:
+            try:
+                os.remove(self.variant_path(digest, size))
+            except FileNotFoundError:
+                pass
+
+    def discard_image(self, path: str) -> None:
+        """ Delete the variants of the image at `path`, which is about to be deleted or replaced (an avatar). """
+        try:
+            digest = self.digest(path)
+        except FileNotFoundError:
+            return
+        with self._lock:
+            self._digests.pop(path, None)
+        self.discard(digest)
+
+    def pregenerate(self, path: str) -> None:
+        """ Start making every variant of a newly uploaded image, without waiting for them. """
+        digest = self.digest(path)
+        for size, longest_side in SIZES.items():
+            self._submit(path, self.variant_path(digest, size), longest_side).add_done_callback(self._log_failure)
+
+    def _submit(self, path: str, target: str, longest_side: int) -> Future:
+        with self._lock:
+            future = self._in_flight.get(target)
+            if future is not None:
+                return future
+            future = self._pool.submit(self._make, path, target, longest_side)
+            self._in_flight[target] = future
+        # outside the lock: the callback runs straight away if the resize is already done
+        future.add_done_callback(lambda _: self._forget(target, future))
+        return future
+
+    def _forget(self, target: str, future: Future) -> None:
+        with self._lock:
+            if self._in_flight.get(target) is future:
+                del self._in_flight[target]
+
+    @staticmethod
+    def _log_failure(future: Future) -> None:
+        """ Nobody waits for the variants made on upload, so their errors are only seen here. """
+        if future.cancelled() or future.exception() is None:
+            return
+        error = future.exception()
+        traceback.print_exception(type(error), error, error.__traceback__)
+
+    @staticmethod
+    def _make(path: str, target: str, longest_side: int) -> str:
+        if os.path.exists(target):  # made by another process, or by a resize that finished since
+            return target
+
+        temporary = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with Image.open(path) as image:
+                image = ImageOps.exif_transpose(image)  # phone photos are often stored sideways
+                image.thumbnail((longest_side, longest_side))  # keeps the aspect ratio, never enlarges
+                if image.mode not in ("RGB", "RGBA"):
+                    image = image.convert("RGBA" if "A" in image.mode or "transparency" in image.info else "RGB")
+                image.save(temporary, "WEBP", quality=WEBP_QUALITY)
+            os.replace(temporary, target)  # never serve a half-written variant
+        except FileNotFoundError:
+            raise
+        except (UnidentifiedImageError, Image.DecompressionBombError):
+            return path
+        except OSError:  # a truncated or corrupt image, or no room left for the variant
+            traceback.print_exc()
+            return path
+        finally:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+        return target
+
+
+image_variants = ImageVariants()
@@ -1,6 +1,10 @@
+import json
 import os
-from typing import List
-from requests import Response, post
+import threading
+from typing import Dict, List
+from requests import Response, Session
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from libs.strings import gettext
 
 
@@ -12,30 +16,87 @@ class MailgunException(Exception):
 class Mailgun:
     MAILGUN_DOMAIN = os.environ.get("MAILGUN_DOMAIN")    # can be None
     MAILGUN_API_KEY = os.environ.get("MAILGUN_API_KEY")  # can be None
+    MAILGUN_API_URL = os.environ.get("MAILGUN_API_URL", "https://api.mailgun.net/v3")
     FROM_TITLE = "Stores REST API"
     FROM_EMAIL = f"do-not-reply@{MAILGUN_DOMAIN}"
 
+    POOL_SIZE = int(os.environ.get("MAILGUN_POOL_SIZE", 10))  # kept-alive connections to Mailgun
+    CONNECT_TIMEOUT = float(os.environ.get("MAILGUN_CONNECT_TIMEOUT", 3.05))  # seconds
+    READ_TIMEOUT = float(os.environ.get("MAILGUN_READ_TIMEOUT", 10))  # seconds
+    MAX_RETRIES = int(os.environ.get("MAILGUN_MAX_RETRIES", 3))
+    BATCH_SIZE = 1000  # the most recipients Mailgun accepts in one batch message
+
+    _session = None
+    _session_lock = threading.Lock()
+
     @classmethod
-    def send_email(cls, email: List[str], subject: str, text: str, html: str) -> Response:
+    def session(cls) -> Session:
+        """
+        One Session shared by every thread, so connections (and their TLS handshakes) are reused between emails.
+        Only failures where Mailgun cannot have accepted the email are retried: connection errors and 429/503.
+        """
+        if cls._session is None:
+            with cls._session_lock:
+                if cls._session is None:
+                    retry = Retry(
+                        total=cls.MAX_RETRIES,
+                        connect=cls.MAX_RETRIES,
+                        read=0,
+                        status_forcelist=(429, 503),
+                        allowed_methods=frozenset({"POST"}),
+                        backoff_factor=0.5,
+                        raise_on_status=False,
+                    )
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=cls.POOL_SIZE, max_retries=retry)
+                    session = Session()
+                    session.mount("https://", adapter)
+                    session.mount("http://", adapter)
+                    cls._session = session
+        return cls._session
+
+    @classmethod
+    def _post_message(cls, data: Dict) -> Response:
         if cls.MAILGUN_API_KEY is None:
             raise MailgunException(gettext("mailgun_failed_load_api_key"))
 
         if cls.MAILGUN_DOMAIN is None:
             raise MailgunException(gettext("mailgun_failed_load_domain"))
 
-        response = post(
-            f"https://api.mailgun.net/v3/{cls.MAILGUN_DOMAIN}/messages",
+        response = cls.session().post(
+            f"{cls.MAILGUN_API_URL}/{cls.MAILGUN_DOMAIN}/messages",
             auth=("api", cls.MAILGUN_API_KEY),
-            data={
-                "from": f"{cls.FROM_TITLE} <{cls.FROM_EMAIL}>",
-                "to": email,
-                "subject": subject,
-                "text": text,
-                "html": html
-            },
+            data={"from": f"{cls.FROM_TITLE} <{cls.FROM_EMAIL}>", **data},
+            timeout=(cls.CONNECT_TIMEOUT, cls.READ_TIMEOUT),
         )
 
         if response.status_code != 200:
             raise MailgunException(gettext("mailgun_error_send_email"))
 
         return response
+
+    @classmethod
+    def send_email(cls, email: List[str], subject: str, text: str, html: str) -> Response:
+        return cls._post_message({"to": email, "subject": subject, "text": text, "html": html})
+
+    @classmethod
+    def send_batch_email(
+        cls, recipient_variables: Dict[str, Dict[str, str]], subject: str, text: str, html: str
+    ) -> List[Response]:
+        """
+        Send one personalised message to many recipients, up to BATCH_SIZE per API call.
+        `recipient_variables` maps each address to its variables, which `subject`, `text` and `html` reference as
+        %recipient.<name>%, e.g. {"jane@example.com": {"link": "https://..."}} and "Click %recipient.link%".
+        Each recipient only sees their own address.
+        """
+        recipients = list(recipient_variables)
+        responses = []
+        for start in range(0, len(recipients), cls.BATCH_SIZE):
+            batch = recipients[start:start + cls.BATCH_SIZE]
+            responses.append(cls._post_message({
+                "to": batch,
+                "subject": subject,
+                "text": text,
+                "html": html,
+                "recipient-variables": json.dumps({address: recipient_variables[address] for address in batch}),
+            }))
+        return responses
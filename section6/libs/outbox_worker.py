@@ -0,0 +1,77 @@
+"""
+libs.outbox_worker
+
+Sends the emails queued in `models.email_outbox` from background threads, so requests never wait for Mailgun.
+
+A dispatcher thread claims due emails in batches and hands them to a small thread pool. Failed sends are retried
+with exponential backoff and jitter, up to MAX_ATTEMPTS, after which the email is marked "failed".
+Several processes can run a worker against the same database; each email is claimed by only one of them.
+"""
+import random
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from db import db
+from libs.mailgun import Mailgun, MailgunException
+from models.email_outbox import EmailOutboxModel
+
+MAX_ATTEMPTS = 8
+BACKOFF_BASE = 5  # seconds, doubled after every failed attempt
+BACKOFF_MAX = 3600
+
+
+def backoff(attempts: int) -> int:
+    delay = min(BACKOFF_BASE * 2 ** attempts, BACKOFF_MAX)
+    return int(delay / 2 + random.uniform(0, delay / 2))
+
+
+class OutboxWorker:
+    def __init__(self, app, workers: int = 4, batch_size: int = 20, poll_interval: float = 1.0, lease: int = 120):
+        self.app = app
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="outbox")
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="outbox-dispatcher", daemon=True)
+
+    def start(self) -> None:
+        if not self._thread.is_alive():
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._thread.join()
+        self._pool.shutdown()
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            try:
+                sent = self.drain_once()
+            except Exception:
+                traceback.print_exc()
+                sent = 0
+            if sent < self.batch_size:  # the outbox is empty for now, keep going straight away otherwise
+                self._stopped.wait(self.poll_interval)
+
+    def drain_once(self) -> int:
+        """ Claim one batch of due emails and send them; returns how many were claimed. """
+        with self.app.app_context():
+            ids = [email.id for email in EmailOutboxModel.claim_due(self.batch_size, self.lease)]
+        wait([self._pool.submit(self._send, _id) for _id in ids])
+        return len(ids)
+
+    def _send(self, _id: int) -> None:
+        with self.app.app_context():
+            email = EmailOutboxModel.query.get(_id)
+            try:
+                Mailgun.send_email(email.recipient_list, email.subject, email.text, email.html)
+            except (MailgunException, OSError) as e:
+                email.mark_failed(str(e), backoff(email.attempts), MAX_ATTEMPTS)
+            except Exception as e:  # a bug, or a row Mailgun.send_email cannot handle: still counts as an attempt
+                traceback.print_exc()
+                db.session.rollback()
+                email.mark_failed(repr(e), backoff(email.attempts), MAX_ATTEMPTS)
+            else:
+                email.mark_sent()
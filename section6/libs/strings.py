@@ -1,29 +1,109 @@
 """
 libs.strings
 
-By default, uses 'en-us.json' file inside the 'strings' top-level folder.
+Loads every '<locale>.json' file inside the 'strings' top-level folder once, into one read-only mapping per locale.
+Each request gets its strings in the best locale from its 'Accept-Language' header, falling back to
+'default_locale' (by default 'en-us') for unknown locales and for keys missing from a translation.
 
-If language changes, set 'libs.strings.default_locale' and run 'libs.strings.refresh()'
+The files are checked for changes at most every RELOAD_INTERVAL seconds; an edited file is loaded into a new
+catalog which then replaces the old one in a single assignment, so a request never sees a half-loaded catalog.
+If the edited files cannot be loaded (invalid JSON, a malformed template...), the previous catalog is kept, and loading
+is tried again once the files change again.
 """
 import json
+import os
+import string
+import threading
+import traceback
+from time import monotonic
+from types import MappingProxyType
+from typing import Dict, Mapping, Optional
+
+from flask import g, has_request_context, request
+
+STRINGS_FOLDER = "strings"
+RELOAD_INTERVAL = 2  # seconds
 
 default_locale = "en-us"
-cached_strings = {}
+
+
+class StringCatalog:
+    def __init__(self, folder: str, fallback_locale: str):
+        self.folder = folder
+        self.fallback_locale = fallback_locale
+        self.mtimes = self.read_mtimes()
+        self.locales = self._load()
+
+    def read_mtimes(self) -> Dict[str, float]:
+        return {
+            filename: os.stat(os.path.join(self.folder, filename)).st_mtime
+            for filename in os.listdir(self.folder)
+            if filename.endswith(".json")
+        }
+
+    def _load(self) -> Mapping[str, Mapping[str, str]]:
+        raw = {}
+        for filename in self.mtimes:
+            with open(os.path.join(self.folder, filename)) as f:
+                strings = json.load(f)
+            for name, template in strings.items():
+                list(string.Formatter().parse(template))  # fail on load, not on use, if a template is malformed
+            raw[filename[:-len(".json")]] = strings
+
+        fallback = raw[self.fallback_locale]
+        return MappingProxyType({
+            locale: MappingProxyType({**fallback, **strings}) for locale, strings in raw.items()
+        })
+
+    def strings_for(self, locale: str) -> Mapping[str, str]:
+        return self.locales.get(locale, self.locales[self.fallback_locale])
+
+
+_catalog = StringCatalog(STRINGS_FOLDER, default_locale)
+_reload_lock = threading.Lock()
+_next_reload_check = monotonic() + RELOAD_INTERVAL
+_rejected_mtimes: Optional[Dict[str, float]] = None  # of the files that last failed to load
 
 
 def refresh():
-    global cached_strings
-    with open(f"strings/{default_locale}.json") as f:
-        cached_strings = json.load(f)
+    """ Reload every strings file now. """
+    global _catalog
+    _catalog = StringCatalog(STRINGS_FOLDER, default_locale)
+
+
+def _reload_if_changed():
+    global _next_reload_check, _rejected_mtimes
+    if monotonic() < _next_reload_check or not _reload_lock.acquire(blocking=False):
+        return
+    try:
+        _next_reload_check = monotonic() + RELOAD_INTERVAL
+        mtimes = _catalog.read_mtimes()
+        if mtimes not in (_catalog.mtimes, _rejected_mtimes):
+            try:
+                refresh()
+            except Exception:  # invalid JSON, a malformed template, the default locale's file gone...
+                traceback.print_exc()
+                _rejected_mtimes = mtimes
+    except OSError:  # a file went away while the folder was read, look again next time
+        traceback.print_exc()
+    finally:
+        _reload_lock.release()
+
+
+def _request_locale() -> str:
+    if not has_request_context():
+        return default_locale
+    if "locale" not in g:
+        g.locale = request.accept_languages.best_match(_catalog.locales.keys(), default=default_locale)
+    return g.locale
 
 
 def gettext(name):
-    return cached_strings[name]
+    _reload_if_changed()
+    return _catalog.strings_for(_request_locale())[name]
 
 
 def set_default_locale(locale):
+    """ Change the locale used when a request does not ask for one we have. Takes effect on the next refresh(). """
     global default_locale
     default_locale = locale
-
-
-refresh()
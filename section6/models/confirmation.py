@@ -1,5 +1,6 @@
 from uuid import uuid4
 from time import time
+from sqlalchemy import inspect
 from db import db
 
 CONFIRMATION_EXPIRATION_DELTA = 1800  # 30 minutes
@@ -7,6 +8,10 @@ CONFIRMATION_EXPIRATION_DELTA = 1800  # 30 minutes
 
 class ConfirmationModel(db.Model):
     __tablename__ = "confirmations"
+    __table_args__ = (
+        # UserModel.most_recent_confirmation: the user's confirmations, newest first
+        db.Index("ix_confirmations_user_id_expire_at", "user_id", "expire_at"),
+    )
 
     id = db.Column(db.String(50), primary_key=True)
     expire_at = db.Column(db.Integer, nullable=False)
@@ -36,8 +41,22 @@ class ConfirmationModel(db.Model):
 
     def save_to_db(self) -> None:
         db.session.add(self)
+        self._update_user()
         db.session.commit()
 
+    def _update_user(self) -> None:
+        """
+        Keep users.latest_confirmation_id and users.is_confirmed in step with the user's newest confirmation, in the
+        same transaction. A new confirmation always expires last, so it becomes the newest; an existing one only
+        updates the user while it is still the newest.
+        """
+        from models.user import UserModel  # models.user imports this module
+
+        users = UserModel.query.filter(UserModel.id == self.user_id)
+        if not inspect(self).pending:
+            users = users.filter(UserModel.latest_confirmation_id == self.id)
+        users.update({"latest_confirmation_id": self.id, "is_confirmed": self.is_confirmed})
+
     def delete_to_db(self) -> None:
         db.session.delete(self)
         db.session.commit()
@@ -0,0 +1,79 @@
+from time import time
+from typing import List
+from uuid import uuid4
+
+from db import db
+
+STATUS_PENDING = "pending"
+STATUS_SENT = "sent"
+STATUS_FAILED = "failed"
+
+
+class EmailOutboxModel(db.Model):
+    """
+    An email waiting to be sent. Requests only insert rows here; `libs.outbox_worker` sends them in the background.
+    """
+    __tablename__ = "email_outbox"
+
+    id = db.Column(db.Integer, primary_key=True)
+    recipients = db.Column(db.Text, nullable=False)  # comma separated
+    subject = db.Column(db.String(255), nullable=False)
+    text = db.Column(db.Text, nullable=False)
+    html = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default=STATUS_PENDING)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.Integer, nullable=False)  # also the lease expiry while a worker holds the row
+    claim_token = db.Column(db.String(32))
+    last_error = db.Column(db.Text)
+
+    def __init__(self, recipients: List[str], **kwargs):
+        super().__init__(**kwargs)
+        self.recipients = ",".join(recipients)
+        self.status = STATUS_PENDING
+        self.attempts = 0
+        self.next_attempt_at = int(time())
+
+    @property
+    def recipient_list(self) -> List[str]:
+        return self.recipients.split(",")
+
+    @classmethod
+    def claim_due(cls, batch_size: int, lease: int) -> List["EmailOutboxModel"]:
+        """
+        Atomically take up to `batch_size` due emails for this worker. Claimed rows are hidden from other workers for
+        `lease` seconds; if this worker dies before recording the result, they become due again after that.
+        """
+        now = int(time())
+        token = uuid4().hex
+        due_ids = (
+            db.session.query(cls.id)
+            .filter(cls.status == STATUS_PENDING, cls.next_attempt_at <= now)
+            .order_by(cls.id)
+            .limit(batch_size)
+        )
+        cls.query.filter(
+            cls.id.in_(due_ids),
+            cls.status == STATUS_PENDING,
+            cls.next_attempt_at <= now,  # re-checked after locking, so two workers cannot claim the same row
+        ).update({cls.claim_token: token, cls.next_attempt_at: now + lease}, synchronize_session=False)
+        db.session.commit()
+        return cls.query.filter_by(claim_token=token).all()
+
+    def mark_sent(self) -> None:
+        self.status = STATUS_SENT
+        self.claim_token = None
+        self.save_to_db()
+
+    def mark_failed(self, error: str, retry_in: int, max_attempts: int) -> None:
+        self.attempts += 1
+        self.last_error = error
+        self.claim_token = None
+        if self.attempts >= max_attempts:
+            self.status = STATUS_FAILED
+        else:
+            self.next_attempt_at = int(time()) + retry_in
+        self.save_to_db()
+
+    def save_to_db(self) -> None:
+        db.session.add(self)
+        db.session.commit()
@@ -0,0 +1,131 @@
+import os
+from typing import Callable, List
+from sqlalchemy.exc import IntegrityError
+from db import db
+
+
+class ImageBlobModel(db.Model):
+    """ One stored image file, shared by every upload with the same content (see libs.blob_store). """
+    __tablename__ = "image_blobs"
+
+    digest = db.Column(db.String(64), primary_key=True)  # SHA-256 of the content, in hex
+    size = db.Column(db.Integer, nullable=False)
+    ref_count = db.Column(db.Integer, nullable=False, index=True)  # rows in image_refs pointing here
+
+    @classmethod
+    def add_reference(cls, digest: str, size: int) -> None:
+        """ Count one more reference to the blob, creating its row for the first one. Does not commit. """
+        updated = cls.query.filter_by(digest=digest).update(
+            {"ref_count": cls.ref_count + 1}, synchronize_session=False
+        )
+        if not updated:
+            db.session.add(cls(digest=digest, size=size, ref_count=1))
+
+    @classmethod
+    def drop_reference(cls, digest: str) -> None:
+        """ Does not commit. A blob left with no references is deleted later, by libs.blob_sweeper. """
+        cls.query.filter_by(digest=digest).update({"ref_count": cls.ref_count - 1}, synchronize_session=False)
+
+    @classmethod
+    def find_unreferenced(cls, limit: int) -> List[str]:
+        return [digest for (digest,) in db.session.query(cls.digest).filter(cls.ref_count <= 0).limit(limit)]
+
+    @classmethod
+    def is_referenced(cls, digest: str) -> bool:
+        return db.session.query(cls.query.filter(cls.digest == digest, cls.ref_count > 0).exists()).scalar()
+
+    @classmethod
+    def find_referenced(cls, after: str, limit: int) -> List[str]:
+        """ The next `limit` referenced digests greater than `after`, in order. """
+        query = db.session.query(cls.digest).filter(cls.ref_count > 0, cls.digest > after)
+        return [digest for (digest,) in query.order_by(cls.digest).limit(limit)]
+
+    @classmethod
+    def delete_with_references(cls, digest: str, is_lost: Callable[[], bool]) -> bool:
+        """
+        Delete a blob whose file is lost, and every image of it, unless `is_lost` says otherwise once the rows are
+        deleted (and locked, so that an upload of the same content waits). Returns whether they were deleted.
+        """
+        ImageRefModel.query.filter_by(digest=digest).delete(synchronize_session=False)
+        cls.query.filter_by(digest=digest).delete(synchronize_session=False)
+        if not is_lost():
+            db.session.rollback()
+            return False
+        db.session.commit()
+        return True
+
+    @classmethod
+    def delete_if_unreferenced(cls, digest: str) -> bool:
+        """ Delete the blob's row unless an upload referenced it again since; returns whether it was deleted. """
+        deleted = cls.query.filter(cls.digest == digest, cls.ref_count <= 0).delete(synchronize_session=False)
+        db.session.commit()
+        return deleted == 1
+
+
+class ImageRefModel(db.Model):
+    """ An image as the user knows it: their file name for a blob. """
+    __tablename__ = "image_refs"
+    __table_args__ = (db.UniqueConstraint("user_id", "filename", name="uq_image_refs_user_id_filename"),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
+    filename = db.Column(db.String(100), nullable=False)
+    digest = db.Column(db.String(64), db.ForeignKey("image_blobs.digest"), nullable=False)
+    blob = db.relationship("ImageBlobModel")
+
+    ADD_ATTEMPTS = 3
+
+    @classmethod
+    def find(cls, user_id: int, filename: str) -> "ImageRefModel":
+        return cls.query.filter_by(user_id=user_id, filename=filename).first()
+
+    @classmethod
+    def used_bytes(cls, user_id: int) -> int:
+        """ Space the user's images take, counting shared blobs in full for each of their owners. """
+        total = db.func.coalesce(db.func.sum(ImageBlobModel.size), 0)
+        return db.session.query(total).select_from(cls).join(cls.blob).filter(cls.user_id == user_id).scalar()
+
+    @classmethod
+    def unique_filename(cls, user_id: int, filename: str) -> str:
+        """ The filename, or if the user already has one by that name, the first free of name_1.ext, name_2.ext... """
+        name, ext = os.path.splitext(filename)
+        candidate, suffix = filename, 0
+        while cls.find(user_id, candidate):
+            suffix += 1
+            candidate = f"{name}_{suffix}{ext}"
+        return candidate
+
+    @classmethod
+    def add(cls, user_id: int, filename: str, digest: str, size: int) -> "ImageRefModel":
+        """ Reference the blob under a free variation of `filename`, and count the reference, in one transaction. """
+        for attempt in range(cls.ADD_ATTEMPTS):
+            ref = cls(user_id=user_id, filename=cls.unique_filename(user_id, filename), digest=digest)
+            ImageBlobModel.add_reference(digest, size)
+            db.session.add(ref)
+            try:
+                db.session.commit()
+                return ref
+            except IntegrityError:  # a concurrent upload took the name, or created the blob row first
+                db.session.rollback()
+                if attempt == cls.ADD_ATTEMPTS - 1:
+                    raise
+
+    @classmethod
+    def delete_for_user(cls, user_id: int) -> None:
+        """ Delete every image of the user, dropping one blob reference for each. Does not commit. """
+        counts = (
+            db.session.query(cls.digest, db.func.count())
+            .filter(cls.user_id == user_id)
+            .group_by(cls.digest)
+            .with_for_update()  # no upload of theirs slips in between the count and the delete
+        )
+        for digest, count in counts.all():
+            ImageBlobModel.query.filter_by(digest=digest).update(
+                {"ref_count": ImageBlobModel.ref_count - count}, synchronize_session=False
+            )
+        cls.query.filter_by(user_id=user_id).delete(synchronize_session=False)
+
+    def delete_to_db(self) -> None:
+        ImageBlobModel.drop_reference(self.digest)
+        db.session.delete(self)
+        db.session.commit()
@@ -9,7 +9,7 @@ class ItemModel(db.Model):
     name = db.Column(db.String(100), nullable=False, unique=True)
     price = db.Column(db.Float(precision=2), nullable=False)
 
-    store_id = db.Column(db.Integer, db.ForeignKey("stores.id"), nullable=False)
+    store_id = db.Column(db.Integer, db.ForeignKey("stores.id"), nullable=False, index=True)
     store = db.relationship("StoreModel")
 
     @classmethod
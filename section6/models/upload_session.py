@@ -0,0 +1,73 @@
+import os
+from time import time
+from typing import List
+from uuid import uuid4
+from db import db
+from libs import image_helper
+
+
+class UploadSessionModel(db.Model):
+    """ An image upload sent in several requests, so that it can be resumed after a dropped connection. """
+    __tablename__ = "upload_sessions"
+
+    id = db.Column(db.String(32), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False, index=True)
+    filename = db.Column(db.String(100), nullable=False)
+    size = db.Column(db.Integer, nullable=False)  # announced when the session is created
+    received = db.Column(db.Integer, nullable=False, default=0)  # bytes written to the temporary file so far
+    expire_at = db.Column(db.Integer, nullable=False)
+
+    def __init__(self, user_id: int, ttl: int, **kwargs):
+        super().__init__(**kwargs)
+        self.id = uuid4().hex
+        self.user_id = user_id
+        self.received = 0
+        self.expire_at = int(time()) + ttl
+
+    @classmethod
+    def find_for_user(cls, _id: str, user_id: int, reload: bool = False) -> "UploadSessionModel":
+        """ With `reload`, a session already loaded by this request is read again from the database. """
+        query = cls.query.populate_existing() if reload else cls.query
+        return query.filter(cls.id == _id, cls.user_id == user_id, cls.expire_at > time()).first()
+
+    @classmethod
+    def find_expired_for_user(cls, user_id: int) -> List["UploadSessionModel"]:
+        return cls.query.filter(cls.user_id == user_id, cls.expire_at <= time()).all()
+
+    @classmethod
+    def find_expired(cls, limit: int) -> List["UploadSessionModel"]:
+        return cls.query.filter(cls.expire_at <= time()).limit(limit).all()
+
+    @classmethod
+    def reserved_bytes(cls, user_id: int) -> int:
+        """ Space held for the user's unfinished uploads, counted against their quota. """
+        return db.session.query(db.func.coalesce(db.func.sum(cls.size), 0)).filter(
+            cls.user_id == user_id, cls.expire_at > time()
+        ).scalar()
+
+    def save_to_db(self) -> None:
+        db.session.add(self)
+        db.session.commit()
+
+    def advance(self, received: int) -> bool:
+        """
+        Record that `received` bytes have arrived, unless another request recorded some since this session was loaded
+        (a compare-and-set on `received`); returns whether it was recorded.
+        """
+        updated = UploadSessionModel.query.filter_by(id=self.id, received=self.received).update(
+            {"received": received}, synchronize_session=False
+        )
+        db.session.commit()
+        return updated == 1
+
+    def delete_to_db(self) -> None:
+        db.session.delete(self)
+        db.session.commit()
+
+    def discard(self) -> None:
+        """ Delete the session, and the bytes received so far. """
+        try:
+            os.remove(image_helper.upload_temp_path(self.id))
+        except FileNotFoundError:
+            pass
+        self.delete_to_db()
@@ -1,8 +1,10 @@
+from typing import Dict, Union
 from flask import request, url_for
-from requests import Response
 from db import db
-from libs.mailgun import Mailgun
 from models.confirmation import ConfirmationModel
+from models.email_outbox import EmailOutboxModel
+from models.image import ImageRefModel
+from models.upload_session import UploadSessionModel
 
 
 class UserModel(db.Model):
@@ -11,11 +13,21 @@ class UserModel(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), nullable=False, unique=True)
     email = db.Column(db.String(80), nullable=False, unique=True)
-    password = db.Column(db.String(80), nullable=False)
+    password = db.Column(db.String(255), nullable=False)  # see libs.passwords
+
+    # Copied from the user's newest confirmation by ConfirmationModel.save_to_db, so that reading them needs no query
+    # on confirmations. No foreign key, as confirmations already references users.
+    latest_confirmation_id = db.Column(db.String(50))
+    is_confirmed = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
+
+    # The user's file in static/images/avatars, set by AvatarUpload. `flask rebuild-avatar-index` recomputes it from
+    # the folder.
+    avatar = db.Column(db.String(100))
 
     confirmation = db.relationship(
         "ConfirmationModel", lazy="dynamic", cascade="all, delete-orphan"
     )
+    upload_sessions = db.relationship(UploadSessionModel, lazy="dynamic", cascade="all, delete-orphan")
 
     # With lazy="dynamic", you can do this:
     # user = UserModel(...)
@@ -28,7 +40,9 @@ class UserModel(db.Model):
 
     @property
     def most_recent_confirmation(self) -> "ConfirmationModel":
-        return self.confirmation.order_by(db.desc(ConfirmationModel.expire_at)).first()
+        if self.latest_confirmation_id is None:
+            return None
+        return ConfirmationModel.find_by_id(self.latest_confirmation_id)
 
     @classmethod
     def find_by_username(cls, username: str) -> "UserModel":
@@ -42,24 +56,40 @@ class UserModel(db.Model):
     def find_by_id(cls, _id: int) -> "UserModel":
         return cls.query.filter_by(id=_id).first()
 
+    @classmethod
+    def find_avatar(cls, _id: int) -> Union[str, None]:
+        return db.session.query(cls.avatar).filter_by(id=_id).scalar()
+
+    @classmethod
+    def replace_avatars(cls, avatars: Dict[int, str]) -> None:
+        """ Set every user's avatar from `avatars` (user id -> filename), and clear it for users not in there. """
+        cls.query.filter(cls.avatar.isnot(None)).update({"avatar": None}, synchronize_session=False)
+        db.session.bulk_update_mappings(cls, [{"id": _id, "avatar": avatar} for _id, avatar in avatars.items()])
+        db.session.commit()
+
     def save_to_db(self) -> None:
         db.session.add(self)
         db.session.commit()
 
     def delete_to_db(self) -> None:
+        """ Their images go too; the blobs no other image shares are deleted later, by libs.blob_sweeper. """
+        ImageRefModel.delete_for_user(self.id)
         db.session.delete(self)
         db.session.commit()
 
-    def send_confirmation_email(self) -> Response:
+    def send_confirmation_email(self) -> EmailOutboxModel:
+        """ Queue the confirmation email; `libs.outbox_worker` sends it after the request has returned. """
         # http://127.0.0.1:5000/api/user/confirm/1 - old
         # http://127.0.0.1:5000/api/user/confirm/<uuid_of_confirmation> - new
         link = request.url_root[0:-1] + url_for(
-            "confirmation", confirmation_id=self.most_recent_confirmation.id
+            "confirmation", confirmation_id=self.latest_confirmation_id
         )
         subject = "Registration confirmation"
         text = f"Please click the link to confirm your registration: {link}"
         html = f"<html><p>Please click the link to confirm your registration: <a href='{link}'>{link}</a></p></html>"
 
-        return Mailgun.send_email([self.email], subject, text, html)
+        email = EmailOutboxModel([self.email], subject=subject, text=text, html=html)
+        email.save_to_db()
+        return email
 
 
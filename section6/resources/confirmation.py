@@ -8,7 +8,6 @@ from flask import make_response, render_template
 from models.confirmation import ConfirmationModel
 from models.user import UserModel
 from schemas.confirmation import ConfirmationSchema
-from libs.mailgun import MailgunException
 from libs.strings import gettext
 
 confirmation_schema = ConfirmationSchema()
@@ -68,18 +67,16 @@ class ConfirmationByUser(Resource):
             return {"message": gettext("user_not_found")}, 404
 
         try:
+            if user.is_confirmed:
+                return {"message": gettext("confirmation_already_confirmed")}, 400
             confirmation = user.most_recent_confirmation
             if confirmation:
-                if confirmation.is_confirmed:
-                    return {"message": gettext("confirmation_already_confirmed")}, 400
                 confirmation.force_to_expire()
 
             new_confirmation = ConfirmationModel(user_id)
             new_confirmation.save_to_db()
             user.send_confirmation_email()
             return {"message": gettext("confirmation_resend_successful")}, 201
-        except MailgunException as e:
-            return {"message": str(e)}, 500
         except:
             traceback.print_exc()
             return {"message": gettext("confirmation_resend_fail")}, 500
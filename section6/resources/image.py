@@ -1,15 +1,61 @@
+from typing import Tuple, Union
 from flask_restful import Resource
 from flask_uploads import UploadNotAllowed
-from flask import send_file, request
+from flask import current_app, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from werkzeug.exceptions import ClientDisconnected
+from werkzeug.utils import secure_filename
+import fcntl
+import mimetypes
 import traceback
 import os
+from uuid import uuid4
 
 from libs import image_helper
+from libs.blob_store import blob_store
+from libs.blob_sweeper import blob_sweeper
+from libs.image_variants import SIZES, image_variants
 from libs.strings import gettext
+from models.image import ImageRefModel
+from models.upload_session import UploadSessionModel
+from models.user import UserModel
 from schemas.image import ImageSchema
+from schemas.upload_session import UploadSessionSchema
 
 image_schema = ImageSchema()
+upload_session_schema = UploadSessionSchema()
+
+
+def _check_size(user_id: int, size: int) -> Union[tuple, None]:
+    """ The error response if an image of `size` bytes is over the size limit or the user's quota, else None. """
+    max_size = current_app.config["IMAGE_MAX_SIZE"]
+    if size > max_size:
+        return {"message": gettext("image_too_large").format(max_size)}, 413
+
+    quota = current_app.config["IMAGE_USER_QUOTA"]
+    used = ImageRefModel.used_bytes(user_id) + UploadSessionModel.reserved_bytes(user_id)
+    if used + size > quota:
+        return {"message": gettext("image_quota_exceeded").format(quota)}, 413
+    return None
+
+
+def _store_image(user_id: int, filename: str, written: Tuple[str, int, str], source: str = None) -> str:
+    """
+    Reference a file written by blob_store.write as the user's `filename`; returns the name it was stored under.
+    If that fails, the file is dropped, or for one written by blob_store.write_file, moved back to its `source`.
+    """
+    digest, size, temporary = written
+    try:
+        ref = ImageRefModel.add(user_id, filename, digest, size)
+    except:
+        if source:
+            blob_store.put_back(temporary, source)
+        else:
+            blob_store.discard(temporary)
+        raise
+    blob_store.keep(temporary, digest)
+    image_variants.pregenerate(blob_store.path(digest))
+    return ref.filename
 
 
 class ImageUpload(Resource):
@@ -18,35 +64,64 @@ class ImageUpload(Resource):
     def post(cls):
         """
         Used to upload an image file.
-        It uses JWt to retrieve user information and then saves the image to the user's folder.
+        It uses JWt to retrieve user information and then saves the image under the user's name for it.
         If there is a filename conflict, it appends a number at the end.
+        Identical files are only stored once, see libs.blob_store.
         """
         data = image_schema.load(request.files)  # {"image": FileStorage}
         user_id = get_jwt_identity()
-        folder = f"user_{user_id}"  # static/images/user_1
-        try:
-            image_path = image_helper.save_image(data["image"], folder=folder)  # data["image"].filename + "_1"
-            basename = image_helper.get_basename(image_path)
-            return {"message": gettext("image_uploaded").format(basename)}, 201
-        except UploadNotAllowed:
+
+        # MAX_CONTENT_LENGTH has already turned away requests too big for any image; werkzeug spooled the file to disk
+        stream = data["image"].stream
+        stream.seek(0, os.SEEK_END)
+        size = stream.tell()
+        stream.seek(0)
+        error = _check_size(user_id, size)
+        if error:
+            return error
+        head = stream.read(image_helper.HEAD_LENGTH)
+        stream.seek(0)
+        if not image_helper.is_image_content(head, data["image"].filename):
+            return {"message": gettext("image_content_mismatch").format(data["image"].filename)}, 400
+
+        filename = secure_filename(data["image"].filename)
+        if not image_helper.is_filename_safe(filename):
             extension = image_helper.get_extension(data["image"])
             return {"message": gettext("image_illegal_extension").format(extension)}, 400
 
+        basename = _store_image(user_id, filename, blob_store.write(stream))
+        return {"message": gettext("image_uploaded").format(basename)}, 201
+
 
 class Image(Resource):
     @classmethod
     @jwt_required()
     def get(cls, filename: str):
         """
-        Returns the requested image if it exists. Looks up inside the logged in user's folder
+        Returns the requested image if it exists. Looks up among the logged in user's images
+        ?size=small|medium|large returns a resized WebP copy instead of the original.
         """
         user_id = get_jwt_identity()
-        folder = f"user_{user_id}"
         if not image_helper.is_filename_safe(filename):
             return {"message": gettext("image_illegal_file_name").format(filename)}, 400
 
+        size = request.args.get("size")
+        if size is not None and size not in SIZES:
+            return {"message": gettext("image_invalid_size").format(size, ", ".join(SIZES))}, 400
+
+        ref = ImageRefModel.find(user_id, filename)
+        if not ref:
+            return {"message": gettext("image_not_found").format(filename)}, 404
+
+        path = blob_store.path(ref.digest)
+        mimetype = None
         try:
-            return send_file(image_helper.get_path(filename, folder=folder))
+            if size:
+                path = image_variants.get(path, size)
+            if path == blob_store.path(ref.digest):  # the original, whose name says nothing of its type
+                mimetype = mimetypes.guess_type(filename)[0]
+            max_age = current_app.config["IMAGE_CACHE_MAX_AGE"]
+            return image_helper.send_image(path, max_age=max_age, private=True, mimetype=mimetype)
         except FileNotFoundError:
             return {"message": gettext("image_not_found").format(filename)}, 404
 
@@ -54,18 +129,15 @@ class Image(Resource):
     @jwt_required()
     def delete(cls, filename: str):
         user_id = get_jwt_identity()
-        folder = f"user_{user_id}"
         if not image_helper.is_filename_safe(filename):
             return {"message": gettext("image_illegal_file_name").format(filename)}, 400
 
-        try:
-            os.remove(image_helper.get_path(filename, folder=folder))
-            return {"message": gettext("image_deleted").format(filename)}, 200
-        except FileNotFoundError:
+        ref = ImageRefModel.find(user_id, filename)
+        if not ref:
             return {"message": gettext("image_not_found").format(filename)}, 404
-        except:
-            traceback.print_exc()
-            return {"message": gettext("image_delete_failed")}, 500
+        ref.delete_to_db()
+        blob_sweeper.wake()  # the file goes once no other image has the same content
+        return {"message": gettext("image_deleted").format(filename)}, 200
 
 
 class AvatarUpload(Resource):
@@ -78,34 +150,194 @@ class AvatarUpload(Resource):
         :return:
         """
         data = image_schema.load(request.files)
-        filename = f"user_{get_jwt_identity()}"
+        user = UserModel.find_by_id(get_jwt_identity())
+        if not user:  # a valid token of a deleted user
+            return {"message": gettext("user_not_found")}, 404
         folder = "avatars"
-        avatar_path = image_helper.find_image_any_format(filename, folder)
-        if avatar_path:
-            try:
-                os.remove(avatar_path)
-            except:
-                return {"message": gettext("avatar_delete_failed")}, 500
-
+        ext = image_helper.get_extension(data["image"].filename)
+        basename = f"user_{user.id}{ext}"
         try:
-            ext = image_helper.get_extension(data["image"].filename)
-            avatar = filename + ext
-            avatar_path = image_helper.save_image(
-                data["image"], folder=folder, name=avatar
+            # under a name of its own first, so that a rejected upload leaves the current avatar as it was
+            uploading = image_helper.get_basename(
+                image_helper.save_image(data["image"], folder=folder, name=f"user_{user.id}.{uuid4().hex}{ext}")
             )
-            basename = image_helper.get_basename(avatar_path)
-            return {"message": gettext("avatar_uploaded").format(basename)}, 200
         except UploadNotAllowed:
             extension = image_helper.get_extension(data["image"])
             return {"message": gettext("image_illegal_extension").format(extension)}, 400
 
+        avatar_path = image_helper.get_path(basename, folder=folder)
+        try:
+            if user.avatar:
+                old_avatar = image_helper.get_path(user.avatar, folder=folder)
+                image_variants.discard_image(old_avatar)
+                if old_avatar != avatar_path:
+                    os.remove(old_avatar)  # one with the same name is replaced below
+        except FileNotFoundError:
+            pass
+        except:
+            traceback.print_exc()
+            os.remove(image_helper.get_path(uploading, folder=folder))
+            return {"message": gettext("avatar_delete_failed")}, 500
+
+        os.replace(image_helper.get_path(uploading, folder=folder), avatar_path)
+        user.avatar = basename
+        user.save_to_db()
+        image_variants.pregenerate(avatar_path)
+        return {"message": gettext("avatar_uploaded").format(basename)}, 200
+
+    @jwt_required()
+    def delete(self):
+        user = UserModel.find_by_id(get_jwt_identity())
+        if not user:
+            return {"message": gettext("user_not_found")}, 404
+        if not user.avatar:
+            return {"message": gettext("avatar_not_found")}, 404
+
+        try:
+            avatar = image_helper.get_path(user.avatar, folder="avatars")
+            image_variants.discard_image(avatar)
+            os.remove(avatar)
+        except FileNotFoundError:
+            pass
+        except:
+            traceback.print_exc()
+            return {"message": gettext("avatar_delete_failed")}, 500
+        user.avatar = None
+        user.save_to_db()
+        return {"message": gettext("avatar_deleted")}, 200
+
 
 class Avatar(Resource):
     @classmethod
     def get(cls, user_id: int):
-        folder = "avatars"
-        filename = f"user_{user_id}"
-        avatar = image_helper.find_image_any_format(filename, folder)
+        """ ?size=small|medium|large returns a resized WebP copy instead of the original. """
+        size = request.args.get("size")
+        if size is not None and size not in SIZES:
+            return {"message": gettext("image_invalid_size").format(size, ", ".join(SIZES))}, 400
+
+        avatar = UserModel.find_avatar(user_id)  # no probing the folder for each image extension
         if avatar:
-            return send_file(avatar)
+            try:
+                path = image_helper.get_path(avatar, folder="avatars")
+                if size:
+                    path = image_variants.get(path, size)
+                return image_helper.send_image(path, max_age=current_app.config["AVATAR_CACHE_MAX_AGE"])
+            except FileNotFoundError:
+                pass
         return {"message": gettext("avatar_not_found")}, 404
+
+
+class UploadSessionList(Resource):
+    @classmethod
+    @jwt_required()
+    def post(cls):
+        """
+        Start a resumable image upload: {"filename": "photo.jpg", "size": <bytes>}.
+        The file is then sent with PATCH /api/upload/sessions/<id>, in as many requests as needed.
+        """
+        data = upload_session_schema.load(request.get_json())
+        user_id = get_jwt_identity()
+        if not image_helper.is_filename_safe(data["filename"]):
+            return {"message": gettext("image_illegal_file_name").format(data["filename"])}, 400
+
+        for expired in UploadSessionModel.find_expired_for_user(user_id):
+            expired.discard()
+
+        error = _check_size(user_id, data["size"])
+        if error:
+            return error
+
+        upload = UploadSessionModel(user_id, current_app.config["IMAGE_UPLOAD_SESSION_TTL"], **data)
+        upload.save_to_db()
+        return upload_session_schema.dump(upload), 201
+
+
+class UploadSession(Resource):
+    @classmethod
+    @jwt_required()
+    def get(cls, upload_id: str):
+        """ How much of the file has been received, to resume the upload from there. """
+        upload = UploadSessionModel.find_for_user(upload_id, get_jwt_identity())
+        if not upload:
+            return {"message": gettext("upload_session_not_found")}, 404
+        return upload_session_schema.dump(upload), 200, {"Upload-Offset": str(upload.received)}
+
+    @classmethod
+    @jwt_required()
+    def patch(cls, upload_id: str):
+        """
+        Append the request body to the upload. The Upload-Offset header must be the number of bytes received so far.
+        The body is written to a temporary file IMAGE_UPLOAD_CHUNK_SIZE bytes at a time, and the upload is rejected as
+        soon as it goes over the size announced when the session was created.
+        Once every byte has arrived, the image is stored like one sent to ImageUpload.
+        Requests for the same session are taken one at a time: the temporary file is locked while one writes to it, and
+        a request that finds it locked gets a 409.
+        """
+        user_id = get_jwt_identity()
+        upload = UploadSessionModel.find_for_user(upload_id, user_id)
+        if not upload:
+            return {"message": gettext("upload_session_not_found")}, 404
+
+        offset = request.headers.get("Upload-Offset", type=int)
+        path = image_helper.upload_temp_path(upload.id)
+        with os.fdopen(os.open(path, os.O_RDWR | os.O_CREAT), "r+b") as f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)  # released when the file is closed
+            except BlockingIOError:
+                return {"message": gettext("upload_session_busy")}, 409, {"Upload-Offset": str(upload.received)}
+            # read again, as the request that held the lock may have moved the offset or finished the upload
+            upload = UploadSessionModel.find_for_user(upload_id, user_id, reload=True)
+            if not upload:
+                return {"message": gettext("upload_session_not_found")}, 404
+            if offset != upload.received:
+                message = gettext("upload_session_offset_mismatch").format(offset, upload.received)
+                return {"message": message}, 409, {"Upload-Offset": str(upload.received)}
+
+            chunk_size = current_app.config["IMAGE_UPLOAD_CHUNK_SIZE"]
+            head_length = min(image_helper.HEAD_LENGTH, upload.size)
+            received = upload.received
+            f.seek(received)
+            f.truncate()  # drop anything written after the last chunk we recorded
+            try:
+                while True:
+                    chunk = request.stream.read(chunk_size)
+                    if not chunk:
+                        break
+                    if received + len(chunk) > upload.size:
+                        f.truncate(upload.received)
+                        return {"message": gettext("image_too_large").format(upload.size)}, 413
+                    f.write(chunk)
+                    received += len(chunk)
+                    if received - len(chunk) < head_length <= received:  # the signature is all there, check it
+                        f.seek(0)
+                        head = f.read(head_length)
+                        f.seek(received)
+                        if not image_helper.is_image_content(head, upload.filename):
+                            upload.discard()
+                            return {"message": gettext("image_content_mismatch").format(upload.filename)}, 400
+            except ClientDisconnected:
+                pass  # keep what arrived, the client resumes from there
+
+            if not upload.advance(received):  # moved by a request that wrote the file without the lock
+                f.truncate(upload.received)
+                message = gettext("upload_session_offset_mismatch").format(offset, upload.received)
+                return {"message": message}, 409, {"Upload-Offset": str(upload.received)}
+            if received < upload.size:
+                return upload_session_schema.dump(upload), 200, {"Upload-Offset": str(received)}
+
+            # still holding the lock, so the image is only stored once; the session is only deleted once it is, so
+            # that a failure can be retried with an empty PATCH
+            basename = _store_image(user_id, upload.filename, blob_store.write_file(path), source=path)
+            upload.delete_to_db()
+        return {"message": gettext("image_uploaded").format(basename)}, 201
+
+    @classmethod
+    @jwt_required()
+    def delete(cls, upload_id: str):
+        """ Abandon the upload. """
+        upload = UploadSessionModel.find_for_user(upload_id, get_jwt_identity())
+        if not upload:
+            return {"message": gettext("upload_session_not_found")}, 404
+        upload.discard()
+        return {"message": gettext("upload_session_deleted")}, 200
+
@@ -9,12 +9,12 @@ from flask_jwt_extended import (
     get_jwt_identity,
     get_jwt,
 )
-from werkzeug.security import safe_str_cmp
 from models.user import UserModel
 from schemas.user import UserSchema
 from blocklist import BLOCKLIST
+from libs import passwords
+from libs.blob_sweeper import blob_sweeper
 from libs.strings import gettext
-from libs.mailgun import MailgunException
 from models.confirmation import ConfirmationModel
 
 # "_" before variable names are private variables that should not be imported anywhere else in Python.
@@ -30,15 +30,17 @@ class UserRegister(Resource):
         if UserModel.find_by_username(user.username) and UserModel.find_by_email(user.email):
             return {"message": gettext("user_username_exists")}, 400
 
+        try:
+            user.password = passwords.hash_password_in_pool(user.password)
+        except passwords.PasswordPoolBusy:
+            return {"message": gettext("user_register_server_busy")}, 503, {"Retry-After": "1"}
+
         try:
             user.save_to_db()
             confirmation = ConfirmationModel(user.id)
             confirmation.save_to_db()
             user.send_confirmation_email()
             return {"message": gettext("user_registered")}, 201
-        except MailgunException as e:
-            user.delete_to_db()  # rollback
-            return {"message": str(e)}, 500
         except:
             traceback.print_exc()
             user.delete_to_db()
@@ -59,6 +61,7 @@ class User(Resource):
         if not user:
             return {"message": gettext("user_not_found")}, 404
         user.delete_to_db()
+        blob_sweeper.wake()  # the files of their images go once no other image has the same content
         return {"message": gettext("user_deleted")}, 200
 
 
@@ -82,13 +85,24 @@ class UserLogin(Resource):
         # Find the user in the DB
         user = UserModel.find_by_username(user_data.username)
 
-        # Check the password if correct
+        # Check the password if correct, on the password hashing pool.
         # This is what the `authenticate()` function used to do.
-        if user and safe_str_cmp(user.password, user_data.password):
+        try:
+            valid = passwords.verify_password_in_pool(user_data.password, user.password if user else None)
+        except passwords.PasswordPoolBusy:
+            return {"message": gettext("user_server_busy")}, 503, {"Retry-After": "1"}
+
+        if valid:
+            if passwords.needs_rehash(user.password):  # stored in plaintext, or with an older cost
+                try:
+                    user.password = passwords.hash_password_in_pool(user_data.password)
+                    user.save_to_db()
+                except passwords.PasswordPoolBusy:
+                    pass  # the login is still valid, rehash next time
+
             # Create access and refresh token
             # identity= is what the `identity()` function used to do.
-            confirmation = user.most_recent_confirmation
-            if confirmation and confirmation.is_confirmed:
+            if user.is_confirmed:
                 access_token = create_access_token(identity=user.id, fresh=True)
                 refresh_token = create_refresh_token(identity=user.id)
                 return {"access_token": access_token, "refresh_token": refresh_token}, 200
@@ -0,0 +1,11 @@
+from marshmallow import fields, validate
+from ma import ma
+from models.upload_session import UploadSessionModel
+
+
+class UploadSessionSchema(ma.SQLAlchemyAutoSchema):
+    size = fields.Integer(required=True, validate=validate.Range(min=1))
+
+    class Meta:
+        model = UploadSessionModel
+        dump_only = ("id", "received", "expire_at")
@@ -7,7 +7,7 @@ class UserSchema(ma.SQLAlchemyAutoSchema):
     class Meta:
         model = UserModel
         load_only = ("password",)
-        dump_only = ("id", "is_activated")
+        dump_only = ("id", "is_activated", "latest_confirmation_id", "is_confirmed", "avatar")
         load_instance = True
 
     @pre_dump
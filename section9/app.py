@@ -1,27 +1,49 @@
+import click
 from flask import Flask, jsonify
 from flask_restful import Api
 from flask_jwt_extended import JWTManager
+from flask_migrate import Migrate
 from marshmallow import ValidationError
 from dotenv import load_dotenv
 
-from db import db
+from db import db, configure_engine, ensure_schema, is_schema_current
 from ma import ma
 from blocklist import BLOCKLIST
+from libs import passwords, rate_limit
 from resources.user import UserRegister, UserLogin, User, TokenRefresh, UserLogout
-from resources.item import Item, ItemList
+from resources.item import Item, ItemList, ItemImport, ItemExport
 from resources.store import Store, StoreList
 from resources.order import Order
+from resources.metrics import Metrics
 
 app = Flask(__name__)
 load_dotenv(".env")
 app.config.from_object("default_config")
 app.config.from_envvar("APPLICATION_SETTINGS")
+configure_engine(app)
 api = Api(app)
+db.init_app(app)
+ma.init_app(app)
+migrate = Migrate(app, db)
+passwords.init_app(app)
+rate_limit.init_app(app)
 
 
-@app.before_first_request
-def create_tables():
-    db.create_all()
+@app.cli.command("init-db")
+def init_db():
+    """ Apply the database migrations. Run once per deploy, before the workers start serving. """
+    if ensure_schema():
+        click.echo("Database migrations applied.")
+    else:
+        click.echo("Database schema is already current.")
+
+
+@app.cli.command("check-db")
+def check_db():
+    """ Exit with status 1 if the database schema is not current. """
+    if not is_schema_current():
+        raise click.ClickException("Database schema is not current, run `flask init-db`.")
+    click.echo("Database schema is current.")
 
 
 @app.errorhandler(ValidationError)
@@ -30,6 +52,7 @@ def handle_marshmallow_validation(err):
 
 
 jwt = JWTManager(app)
+BLOCKLIST.init_app(app)
 
 
 # This method will check if a token is blocklisted, and will be called automatically when blocklist is enabled
@@ -42,14 +65,18 @@ api.add_resource(Store, "/store/<string:name>")
 api.add_resource(StoreList, "/stores")
 api.add_resource(Item, "/item/<string:name>")
 api.add_resource(ItemList, "/items")
+api.add_resource(ItemImport, "/items/import")
+api.add_resource(ItemExport, "/items/export")
 api.add_resource(UserRegister, "/register")
 api.add_resource(User, "/user/<int:user_id>")
 api.add_resource(UserLogin, "/login")
 api.add_resource(TokenRefresh, "/refresh")
 api.add_resource(UserLogout, "/logout")
 api.add_resource(Order, "/order")
+if app.config.get("INTERNAL_METRICS_ENABLED"):
+    api.add_resource(Metrics, "/internal/metrics")
 
 if __name__ == "__main__":
-    db.init_app(app)
-    ma.init_app(app)
+    with app.app_context():
+        ensure_schema()
     app.run(port=5000, debug=True)
@@ -1,9 +1,213 @@
 """
 blocklist.py
 
-This file just contains the blocklist of the JWT tokens–it will be imported by
-app and the logout resource so that tokens can be added to the blocklist when the
-user logs out.
+This file contains the blocklist of the JWT tokens–it will be imported by app and the logout resource so that tokens
+can be added to the blocklist when the user logs out.
+
+By default the blocklist lives in process memory. Set `BLOCKLIST_REDIS_URL` in the app config to share it between
+all workers through Redis; each entry then expires in Redis when the token itself would have expired.
 """
+import heapq
+import threading
+import traceback
+from abc import ABC, abstractmethod
+from time import time
+
+from libs.bloom_filter import BloomFilter
+
+
+class BlocklistBackend(ABC):
+    @abstractmethod
+    def add(self, jti: str, expires_at: int) -> None:
+        """ Revoke `jti` until `expires_at` (the token's "exp" claim, a unix timestamp). """
+
+    @abstractmethod
+    def __contains__(self, jti: str) -> bool:
+        pass
+
+    def stats(self) -> dict:
+        return {}
+
+
+class InMemoryBlocklist(BlocklistBackend):
+    """
+    Only visible to the current process.
+
+    Each jti is kept until its token expires. Expired entries are evicted a few at a time on every add and lookup,
+    oldest first (from a heap ordered by expiry), so memory stays proportional to the tokens that are still valid.
+    """
+
+    EVICTIONS_PER_CALL = 16
+
+    def __init__(self):
+        self._expires_at = {}  # jti -> exp
+        self._heap = []  # (exp, jti), soonest expiry first
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def _evict_expired(self, now: float) -> None:
+        for _ in range(self.EVICTIONS_PER_CALL):
+            if not self._heap or self._heap[0][0] > now:
+                return
+            expires_at, jti = heapq.heappop(self._heap)
+            if self._expires_at.get(jti) == expires_at:  # skip stale heap entries left by a re-add
+                del self._expires_at[jti]
+                self.evictions += 1
+
+    def add(self, jti: str, expires_at: int) -> None:
+        now = time()
+        with self._lock:
+            self._evict_expired(now)
+            if expires_at <= now or self._expires_at.get(jti, 0) >= expires_at:
+                return
+            self._expires_at[jti] = expires_at
+            heapq.heappush(self._heap, (expires_at, jti))
+
+    def __contains__(self, jti: str) -> bool:
+        now = time()
+        with self._lock:
+            self._evict_expired(now)
+            return self._expires_at.get(jti, 0) > now
+
+    @property
+    def size(self) -> int:
+        return len(self._expires_at)
+
+    def stats(self) -> dict:
+        return {"size": self.size, "evictions": self.evictions}
+
+
+class RedisBlocklist(BlocklistBackend):
+    """
+    Shared between processes through Redis, one key per revoked jti with a TTL of the remaining token lifetime.
+
+    Every process keeps a local Bloom filter of the revoked jtis, fed by a pub/sub channel, so checking a token that
+    was never revoked (almost every request) does not go over the network. A "maybe" from the filter is confirmed
+    against Redis. If the subscriber thread is not running (for example after a fork), or has reconnected and the
+    filter has not been rebuilt since, revocations may have been missed and every check goes to Redis.
+
+    The filter is rebuilt from the live keys when it fills up, sized for at least twice as many jtis as there are, so
+    that many long-lived revocations do not make it full again straight away.
+    """
+
+    KEY_PREFIX = "blocklist:"
+    CHANNEL = "blocklist"
+
+    def __init__(self, client, bloom_capacity: int = 100_000, bloom_error_rate: float = 0.001):
+        self._client = client
+        self._bloom_capacity = bloom_capacity
+        self._bloom_error_rate = bloom_error_rate
+        self._lock = threading.Lock()  # guards the filters, the generation and `_in_sync`
+        self._rebuild_lock = threading.Lock()  # one rebuild at a time, so none misses the jtis fed to another
+        self._bloom = BloomFilter(bloom_capacity, bloom_error_rate)
+        self._rebuilding = None  # jtis revoked while a rebuild scans Redis
+        self._generation = 0  # bumped on every reconnection of the subscriber
+        self._in_sync = False
+
+        # Subscribe before loading the existing keys, so a jti revoked in between is not missed.
+        pubsub = client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(**{self.CHANNEL: self._on_revoked})
+        # Called after the pubsub's own callback has subscribed again; revocations published meanwhile were lost.
+        pubsub.connection.register_connect_callback(self._on_reconnect)
+        self._listener = pubsub.run_in_thread(sleep_time=1, daemon=True)
+        self._rebuild_bloom()
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs) -> "RedisBlocklist":
+        import redis  # only needed when the shared blocklist is configured
+
+        return cls(redis.Redis.from_url(url, decode_responses=True), **kwargs)
+
+    def _rebuild_bloom(self) -> None:
+        """ Load the revoked jtis from Redis into a new filter, sized for them, and swap it in. """
+        with self._rebuild_lock:
+            with self._lock:
+                self._rebuilding = []
+                generation = self._generation
+            try:
+                jtis = [
+                    key[len(self.KEY_PREFIX):]
+                    for key in self._client.scan_iter(match=f"{self.KEY_PREFIX}*", count=1000)
+                ]
+            except Exception:
+                with self._lock:
+                    self._rebuilding = None
+                raise
+            with self._lock:
+                jtis += self._rebuilding
+                bloom = BloomFilter(max(self._bloom_capacity, 2 * len(jtis)), self._bloom_error_rate)
+                for jti in jtis:
+                    bloom.add(jti)
+                self._bloom = bloom
+                self._rebuilding = None
+                # a reconnection during the scan may have lost revocations the scan had already gone past
+                self._in_sync = generation == self._generation
+
+    def _remember(self, jti: str) -> bool:
+        """ Add `jti` to the local filter(s) and return whether the filter needs rebuilding. """
+        with self._lock:
+            self._bloom.add(jti)
+            if self._rebuilding is not None:
+                self._rebuilding.append(jti)
+            return self._bloom.is_full and self._rebuilding is None
+
+    def _on_revoked(self, message) -> None:
+        if self._remember(message["data"]):
+            # Expired jtis are gone from Redis, so rebuilding from the live keys brings the false positive rate down.
+            self._rebuild_bloom()
+
+    def _on_reconnect(self, connection) -> None:
+        with self._lock:
+            self._generation += 1
+            self._in_sync = False
+        # not on the subscriber thread, which is in the middle of reconnecting
+        threading.Thread(target=self._resync, name="blocklist-resync", daemon=True).start()
+
+    def _resync(self) -> None:
+        try:
+            self._rebuild_bloom()
+        except Exception:  # checks keep going to Redis until the next reconnection rebuilds it
+            traceback.print_exc()
+
+    def add(self, jti: str, expires_at: int) -> None:
+        ttl = int(expires_at - time())
+        if ttl <= 0:
+            return  # the token has already expired and will be rejected anyway
+
+        pipeline = self._client.pipeline()
+        pipeline.set(f"{self.KEY_PREFIX}{jti}", 1, ex=ttl)
+        pipeline.publish(self.CHANNEL, jti)
+        pipeline.execute()
+        self._remember(jti)
+
+    def __contains__(self, jti: str) -> bool:
+        if self._in_sync and self._listener.is_alive() and jti not in self._bloom:
+            return False
+        return bool(self._client.exists(f"{self.KEY_PREFIX}{jti}"))
+
+    def stats(self) -> dict:
+        return {"bloom_in_sync": self._in_sync and self._listener.is_alive()}
+
+
+class Blocklist:
+    """ What the rest of the app imports. The backend is chosen from the app config in `init_app`. """
+
+    def __init__(self, backend: BlocklistBackend = None):
+        self.backend = backend or InMemoryBlocklist()
+
+    def init_app(self, app) -> None:
+        redis_url = app.config.get("BLOCKLIST_REDIS_URL")
+        if redis_url:
+            self.backend = RedisBlocklist.from_url(redis_url)
+
+    def add(self, jti: str, expires_at: int) -> None:
+        self.backend.add(jti, expires_at)
+
+    def __contains__(self, jti: str) -> bool:
+        return jti in self.backend
+
+    def stats(self) -> dict:
+        return self.backend.stats()
+
 
-BLOCKLIST = set()
+BLOCKLIST = Blocklist()
@@ -2,3 +2,14 @@ import os
 
 DEBUG = False
 SQLALCHEMY_DATABASE_URI = os.environ.get("DATABASE_URL", "sqlite:///data.db")
+BLOCKLIST_REDIS_URL = os.environ.get("REDIS_URL")
+PASSWORD_SCRYPT_N = int(os.environ.get("PASSWORD_SCRYPT_N", 2 ** 14))
+PASSWORD_POOL_WORKERS = int(os.environ.get("PASSWORD_POOL_WORKERS", 2))
+PASSWORD_POOL_QUEUE = int(os.environ.get("PASSWORD_POOL_QUEUE", 6))
+RATE_LIMIT_REDIS_URL = os.environ.get("REDIS_URL")
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 5))
+DB_POOL_MAX_OVERFLOW = int(os.environ.get("DB_POOL_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT = int(os.environ.get("DB_POOL_TIMEOUT", 30))
+DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", 1800))
+DB_POOL_PRE_PING = os.environ.get("DB_POOL_PRE_PING", "true").lower() == "true"
+INTERNAL_METRICS_ENABLED = os.environ.get("INTERNAL_METRICS_ENABLED", "false").lower() == "true"
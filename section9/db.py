@@ -1,3 +1,150 @@
+import sqlite3
+from contextlib import contextmanager
+from typing import Hashable, Iterator, Optional, Set
+
+import flask_migrate
+from alembic.script import ScriptDirectory
+from flask import current_app
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import MetaData, event, inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError, ProgrammingError
+from sqlalchemy.orm import Session
+
+from libs.pool_metrics import InstrumentedQueuePool
+
+convention = {
+    "ix": "ix_%(column_0_label)s",
+    "uq": "uq_%(table_name)s_%(column_0_name)s",
+    "ck": "ck_%(table_name)s_%(constraint_name)s",
+    "fk": "fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s",
+    "pk": "pk_%(table_name)s"
+}
+
+metadata = MetaData(naming_convention=convention)
+db = SQLAlchemy(metadata=metadata)
+
+_IN_UNIT_OF_WORK = "in_unit_of_work"
+_PENDING_INVALIDATIONS = "pending_invalidations"
+
+
+@contextmanager
+def unit_of_work() -> Iterator[Session]:
+    """
+    Group several model writes into a single transaction:
+
+        with unit_of_work():
+            order.set_status("complete")
+            item.save_to_db()
+
+    Inside the block, save_to_db/delete_from_db only stage their changes; everything is committed once when the block
+    exits, or rolled back if it raises. Nested blocks join the outermost one.
+    """
+    session = db.session
+    if session.info.get(_IN_UNIT_OF_WORK):
+        yield session
+        return
+
+    session.info[_IN_UNIT_OF_WORK] = True
+    try:
+        yield session
+        session.commit()
+    except:
+        session.rollback()
+        raise
+    finally:
+        session.info.pop(_IN_UNIT_OF_WORK, None)
+
+
+def commit() -> None:
+    """ Commit the session, unless a unit_of_work is open, in which case it will commit for us. """
+    if not db.session.info.get(_IN_UNIT_OF_WORK):
+        db.session.commit()
+
+
+def invalidate_on_commit(cache, key: Hashable) -> None:
+    """
+    Drop `key` from `cache` once the current transaction commits. Invalidating any earlier would let a concurrent
+    request cache the old row again before the new one is visible.
+    """
+    db.session.info.setdefault(_PENDING_INVALIDATIONS, []).append((cache, key))
+
+
+@event.listens_for(Session, "after_commit")
+def _run_pending_invalidations(session: Session) -> None:
+    for cache, key in session.info.pop(_PENDING_INVALIDATIONS, []):
+        cache.invalidate(key)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_pending_invalidations(session: Session) -> None:
+    session.info.pop(_PENDING_INVALIDATIONS, None)
+
+
+INITIAL_REVISION = "a330c1fa3179"  # the schema create_all() used to build, before migrations
+
+
+def _migration_heads() -> Set[str]:
+    config = current_app.extensions["migrate"].migrate.get_config()
+    return set(ScriptDirectory.from_config(config).get_heads())
+
+
+def _database_revisions() -> Optional[Set[str]]:
+    """ The revisions the database is at, or None if it has never been migrated. """
+    try:
+        return {row[0] for row in db.session.execute(text("SELECT version_num FROM alembic_version"))}
+    except (OperationalError, ProgrammingError):  # no alembic_version table yet
+        db.session.rollback()
+        return None
+
+
+def is_schema_current() -> bool:
+    """ Whether the database has had every migration applied, found with a single query. """
+    return _database_revisions() == _migration_heads()
+
+
+def ensure_schema() -> bool:
+    """
+    Apply any pending migrations; returns whether there were some. Run once per deploy (`flask init-db`, or the
+    gunicorn `on_starting` hook) rather than on the first request of every worker.
+    A database created by create_all() before there were migrations is stamped with the initial revision first.
+    """
+    revisions = _database_revisions()
+    if revisions == _migration_heads():
+        return False
+    if revisions is None and set(db.metadata.tables) & set(inspect(db.engine).get_table_names()):
+        flask_migrate.stamp(revision=INITIAL_REVISION)
+    db.session.remove()
+    flask_migrate.upgrade()
+    return True
+
+
+def configure_engine(app) -> None:
+    """
+    Build SQLALCHEMY_ENGINE_OPTIONS from the DB_POOL_* config keys. SQLite keeps SQLAlchemy's default pool, since
+    there is no server to hold connections to; it gets the pragmas in `_set_sqlite_pragmas` instead.
+    """
+    options = app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", {})
+    options.setdefault("pool_pre_ping", app.config.get("DB_POOL_PRE_PING", True))
+    if app.config["SQLALCHEMY_DATABASE_URI"].startswith("sqlite"):
+        return
+
+    options.setdefault("poolclass", InstrumentedQueuePool)
+    options.setdefault("pool_size", app.config.get("DB_POOL_SIZE", 5))
+    options.setdefault("max_overflow", app.config.get("DB_POOL_MAX_OVERFLOW", 10))
+    options.setdefault("pool_timeout", app.config.get("DB_POOL_TIMEOUT", 30))
+    options.setdefault("pool_recycle", app.config.get("DB_POOL_RECYCLE", 1800))
+
 
-db = SQLAlchemy()
+@event.listens_for(Engine, "connect")
+def _set_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    """
+    WAL lets readers carry on while a write is in progress, instead of blocking on it; busy_timeout makes a
+    writer wait for the lock instead of failing straight away with "database is locked".
+    """
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")  # safe with WAL: a crash can lose the last commits, not corrupt
+        cursor.execute("PRAGMA busy_timeout=5000")
+        cursor.close()
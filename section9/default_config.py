@@ -4,3 +4,18 @@ SQLALCHEMY_TRACK_MODIFICATIONS = False
 PROPAGATE_EXCEPTIONS = True
 SECRET_KEY = "change-this-key-in-the-application-config"
 JWT_SECRET_KEY = "change-this-key-to-something-different-in-the-application-config"
+BLOCKLIST_REDIS_URL = None  # e.g. "redis://localhost:6379/0" to share the JWT blocklist between workers
+PASSWORD_SCRYPT_N = 2 ** 14  # scrypt cost; raising it rehashes each password on its next login
+PASSWORD_POOL_WORKERS = 2  # threads hashing passwords
+PASSWORD_POOL_QUEUE = 6  # logins allowed to wait for one of them before returning 503
+LOGIN_RATE_LIMIT_IP_ATTEMPTS = 20  # login attempts allowed per IP address...
+LOGIN_RATE_LIMIT_IP_PERIOD = 60  # ...every this many seconds
+LOGIN_RATE_LIMIT_USERNAME_ATTEMPTS = 5
+LOGIN_RATE_LIMIT_USERNAME_PERIOD = 60
+RATE_LIMIT_REDIS_URL = None  # e.g. "redis://localhost:6379/0" to share the limits between workers
+DB_POOL_SIZE = 5  # connections kept open to the database (ignored for SQLite)
+DB_POOL_MAX_OVERFLOW = 10  # extra connections opened under load, closed once returned
+DB_POOL_TIMEOUT = 30  # seconds to wait for a free connection before failing
+DB_POOL_RECYCLE = 1800  # seconds before a connection is replaced
+DB_POOL_PRE_PING = True  # check a connection is alive before using it
+INTERNAL_METRICS_ENABLED = False  # GET /internal/metrics, unauthenticated: only enable it where it is not public
@@ -0,0 +1,58 @@
+"""
+Compares creating items one `POST /item/<name>` at a time with the bulk `POST /items/import` endpoint, and measures
+`GET /items/export`, against a throwaway SQLite database.
+
+    python item_import_benchmark.py [rows]
+"""
+import json
+import os
+import sys
+import tempfile
+from time import perf_counter
+
+os.environ.setdefault("APPLICATION_SETTINGS", "default_config.py")
+database = os.path.join(tempfile.mkdtemp(), "benchmark.db")
+
+from app import app  # noqa: E402
+from db import db  # noqa: E402
+from flask_jwt_extended import create_access_token  # noqa: E402
+from models.store import StoreModel  # noqa: E402
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+SINGLE_ROWS = min(ROWS, 1000)  # one request per item is too slow to run for every row
+
+app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{database}"  # only read when the engine is first created
+
+with app.app_context():
+    db.create_all()
+    StoreModel(name="benchmark").save_to_db()
+    store_id = StoreModel.find_by_name("benchmark").id
+    headers = {"Authorization": f"Bearer {create_access_token(identity=1, fresh=True)}"}
+
+client = app.test_client()
+
+
+def report(label: str, rows: int, seconds: float) -> None:
+    print(f"{label:<32} {rows:>8} rows {seconds:>8.2f} s {rows / seconds:>10.0f} rows/s")
+
+
+start = perf_counter()
+for i in range(SINGLE_ROWS):
+    client.post(f"/item/single-{i}", json={"price": 1.99, "store_id": store_id}, headers=headers)
+report("POST /item/<name>", SINGLE_ROWS, perf_counter() - start)
+
+ndjson = "".join(json.dumps({"name": f"ndjson-{i}", "price": 1.99, "store_id": store_id}) + "\n" for i in range(ROWS))
+start = perf_counter()
+response = client.post("/items/import", data=ndjson, content_type="application/x-ndjson", headers=headers)
+report("POST /items/import (NDJSON)", response.get_json()["inserted"], perf_counter() - start)
+
+csv_body = "name,price,store_id\n" + "".join(f"csv-{i},1.99,{store_id}\n" for i in range(ROWS))
+start = perf_counter()
+response = client.post("/items/import", data=csv_body, content_type="text/csv", headers=headers)
+report("POST /items/import (CSV)", response.get_json()["inserted"], perf_counter() - start)
+
+for export_format in ("ndjson", "csv"):
+    start = perf_counter()
+    response = client.get(f"/items/export?format={export_format}")
+    exported = len(response.get_data().splitlines()) - (export_format == "csv")
+    report(f"GET /items/export ({export_format})", exported, perf_counter() - start)
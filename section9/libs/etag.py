@@ -0,0 +1,26 @@
+"""
+libs.etag
+
+ETags for the catalogue endpoints, built from the per-table version counters in `models.table_version`.
+A conditional GET costs one small query instead of loading and dumping the rows.
+"""
+from flask import request
+
+from models.table_version import TableVersionModel
+
+
+def catalogue_etag(*tables: str) -> str:
+    versions = TableVersionModel.find_versions(tables)
+    return "-".join(f"{table}.{versions.get(table, 0)}" for table in tables)
+
+
+def is_not_modified(etag: str) -> bool:
+    return request.if_none_match.contains_weak(etag)
+
+
+def etag_headers(etag: str) -> dict:
+    return {"ETag": f'"{etag}"'}
+
+
+def not_modified_response(etag: str):
+    return "", 304, etag_headers(etag)
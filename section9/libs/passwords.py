@@ -0,0 +1,107 @@
+"""
+libs.passwords
+
+Password hashing with scrypt (from the standard library, so no extra dependency).
+Hashes are stored as "scrypt$<n>$<r>$<p>$<salt>$<hash>", so the cost can be raised later: a login whose hash was made
+with other parameters is transparently rehashed (see `needs_rehash`).
+
+Hashing is deliberately slow, so it runs on a small bounded thread pool (hashlib.scrypt releases the GIL).
+When that pool is saturated, `PasswordPoolBusy` is raised instead of letting logins queue up behind each other and
+tie up every request thread.
+"""
+import base64
+import hashlib
+import hmac
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+ALGORITHM = "scrypt"
+SALT_BYTES = 16
+HASH_BYTES = 32
+
+# Overridden from the app config in init_app.
+cost = {"n": 2 ** 14, "r": 8, "p": 1}
+_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="passwords")
+_slots = threading.BoundedSemaphore(8)  # jobs running or queued on the pool
+_dummy_hash = None  # of a random password, checked for unknown usernames
+
+
+class PasswordPoolBusy(Exception):
+    pass
+
+
+def init_app(app) -> None:
+    global _pool, _slots, _dummy_hash
+    cost.update(
+        n=app.config.get("PASSWORD_SCRYPT_N", cost["n"]),
+        r=app.config.get("PASSWORD_SCRYPT_R", cost["r"]),
+        p=app.config.get("PASSWORD_SCRYPT_P", cost["p"]),
+    )
+    workers = app.config.get("PASSWORD_POOL_WORKERS", 2)
+    _pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="passwords")
+    _slots = threading.BoundedSemaphore(workers + app.config.get("PASSWORD_POOL_QUEUE", 6))
+    _dummy_hash = _random_hash()  # now rather than on the first unknown username, which would then take longer
+
+
+def _b64(raw: bytes) -> str:
+    return base64.b64encode(raw).decode()
+
+
+def _scrypt(password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+    return hashlib.scrypt(
+        password.encode(), salt=salt, n=n, r=r, p=p, maxmem=128 * n * r * p + 1024 * 1024, dklen=HASH_BYTES
+    )
+
+
+def hash_password(password: str) -> str:
+    salt = os.urandom(SALT_BYTES)
+    digest = _scrypt(password, salt, **cost)
+    return f"{ALGORITHM}${cost['n']}${cost['r']}${cost['p']}${_b64(salt)}${_b64(digest)}"
+
+
+def verify_password(password: str, stored: str) -> bool:
+    parts = stored.split("$")
+    if len(parts) != 6 or parts[0] != ALGORITHM:
+        # Stored before passwords were hashed; needs_rehash() is True for it, so it gets hashed on this login.
+        return hmac.compare_digest(stored.encode(), password.encode())
+
+    _, n, r, p, salt, digest = parts
+    candidate = _scrypt(password, base64.b64decode(salt), int(n), int(r), int(p))
+    return hmac.compare_digest(candidate, base64.b64decode(digest))
+
+
+def _random_hash() -> str:
+    return hash_password(_b64(os.urandom(SALT_BYTES)))
+
+
+def needs_rehash(stored: str) -> bool:
+    return not stored.startswith(f"{ALGORITHM}${cost['n']}${cost['r']}${cost['p']}$")
+
+
+def _run_in_pool(function, *args):
+    if not _slots.acquire(blocking=False):
+        raise PasswordPoolBusy()
+    try:
+        return _pool.submit(function, *args).result()
+    finally:
+        _slots.release()
+
+
+def hash_password_in_pool(password: str) -> str:
+    return _run_in_pool(hash_password, password)
+
+
+def verify_password_in_pool(password: str, stored: Optional[str]) -> bool:
+    """
+    With no stored hash (no user by that name), a dummy one is checked anyway and False returned, so that how long a
+    login takes does not tell which usernames exist.
+    """
+    global _dummy_hash
+    if stored is None:
+        if _dummy_hash is None or needs_rehash(_dummy_hash):
+            _dummy_hash = _random_hash()
+        _run_in_pool(verify_password, password, _dummy_hash)
+        return False
+    return _run_in_pool(verify_password, password, stored)
@@ -0,0 +1,78 @@
+"""
+libs.pool_metrics
+
+Live statistics about the database connection pool: how many connections are checked out or in overflow, and how
+long requests waited to get one. The wait times come from InstrumentedQueuePool, which the engine uses instead of
+SQLAlchemy's QueuePool when the pool is configured (see db.configure_engine).
+"""
+import bisect
+import threading
+from time import perf_counter
+
+from sqlalchemy import event
+from sqlalchemy.pool import Pool, QueuePool
+
+
+class Histogram:
+    def __init__(self, bounds):
+        self.bounds = list(bounds)  # upper bounds of each bucket; one more bucket catches everything above
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.total = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        with self._lock:
+            self.counts[bisect.bisect_left(self.bounds, value)] += 1
+            self.total += value
+
+    def snapshot(self) -> dict:
+        labels = [f"<={bound}" for bound in self.bounds] + [f">{self.bounds[-1]}"]
+        return {"buckets": dict(zip(labels, self.counts)), "count": sum(self.counts), "sum": self.total}
+
+
+class PoolMetrics:
+    def __init__(self):
+        self.checkout_wait_ms = Histogram([1, 5, 10, 50, 100, 500, 1000, 5000])
+        self.checkouts = 0
+        self.connects = 0
+        self.invalidations = 0
+
+    def snapshot(self, pool: Pool) -> dict:
+        stats = {
+            "pool": type(pool).__name__,
+            "checkouts": self.checkouts,
+            "connects": self.connects,
+            "invalidations": self.invalidations,
+            "checkout_wait_ms": self.checkout_wait_ms.snapshot(),
+        }
+        if isinstance(pool, QueuePool):
+            stats.update(size=pool.size(), checked_out=pool.checkedout(), checked_in=pool.checkedin(),
+                         overflow=pool.overflow())
+        return stats
+
+
+pool_metrics = PoolMetrics()
+
+
+class InstrumentedQueuePool(QueuePool):
+    def _do_get(self):
+        start = perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            pool_metrics.checkout_wait_ms.observe((perf_counter() - start) * 1000)
+
+
+@event.listens_for(Pool, "checkout")
+def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+    pool_metrics.checkouts += 1
+
+
+@event.listens_for(Pool, "connect")
+def _on_connect(dbapi_connection, connection_record):
+    pool_metrics.connects += 1
+
+
+@event.listens_for(Pool, "invalidate")
+def _on_invalidate(dbapi_connection, connection_record, exception):
+    pool_metrics.invalidations += 1
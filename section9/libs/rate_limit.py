@@ -0,0 +1,110 @@
+"""
+libs.rate_limit
+
+Token bucket rate limiting. Each key (an IP address, a username...) has a bucket of `capacity` tokens that refills at
+`capacity / period` tokens per second; every attempt takes one token, and an attempt finding the bucket empty is
+rejected with the number of seconds until a token is available.
+
+A bucket is only a few numbers, and it is forgotten once it has refilled completely, because a full bucket is the same
+as no bucket. By default buckets live in process memory; set `RATE_LIMIT_REDIS_URL` to share them between workers.
+"""
+import threading
+from collections import OrderedDict
+from time import time
+
+
+class InMemoryRateLimitBackend:
+    SWEEP_PER_CALL = 16
+
+    def __init__(self):
+        self._buckets = OrderedDict()  # key -> (tokens, updated_at, full_at), least recently updated first
+        self._lock = threading.Lock()
+
+    def _sweep(self, now: float) -> None:
+        # Every bucket is full at most `period` seconds after its last update, so walking from the least recently
+        # updated one drops each idle bucket at most `period` seconds late.
+        for _ in range(self.SWEEP_PER_CALL):
+            if not self._buckets:
+                return
+            key, (_, _, full_at) = next(iter(self._buckets.items()))
+            if full_at > now:
+                return
+            del self._buckets[key]
+
+    def take(self, key: str, capacity: int, rate: float) -> float:
+        now = time()
+        with self._lock:
+            self._sweep(now)
+            tokens, updated_at, _ = self._buckets.pop(key, (capacity, now, now))
+            tokens = min(capacity, tokens + (now - updated_at) * rate)
+            retry_after = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                retry_after = (1 - tokens) / rate
+            self._buckets[key] = (tokens, now, now + (capacity - tokens) / rate)
+            return retry_after
+
+
+class RedisRateLimitBackend:
+    KEY_PREFIX = "rate_limit:"
+
+    # Same algorithm as InMemoryRateLimitBackend.take, run atomically inside Redis.
+    TAKE_SCRIPT = """
+    local capacity = tonumber(ARGV[1])
+    local rate = tonumber(ARGV[2])
+    local now = tonumber(ARGV[3])
+    local bucket = redis.call("HMGET", KEYS[1], "tokens", "updated_at")
+    local tokens = tonumber(bucket[1]) or capacity
+    local updated_at = tonumber(bucket[2]) or now
+    tokens = math.min(capacity, tokens + (now - updated_at) * rate)
+    local retry_after = 0
+    if tokens >= 1 then
+        tokens = tokens - 1
+    else
+        retry_after = (1 - tokens) / rate
+    end
+    redis.call("HSET", KEYS[1], "tokens", tostring(tokens), "updated_at", tostring(now))
+    redis.call("PEXPIRE", KEYS[1], math.ceil((capacity - tokens) / rate * 1000) + 1)
+    return tostring(retry_after)
+    """
+
+    def __init__(self, client):
+        self._take = client.register_script(self.TAKE_SCRIPT)
+
+    @classmethod
+    def from_url(cls, url: str) -> "RedisRateLimitBackend":
+        import redis  # only needed when the shared rate limiter is configured
+
+        return cls(redis.Redis.from_url(url))
+
+    def take(self, key: str, capacity: int, rate: float) -> float:
+        return float(self._take(keys=[f"{self.KEY_PREFIX}{key}"], args=[capacity, rate, time()]))
+
+
+class RateLimiter:
+    def __init__(self, name: str, capacity: int, period: float):
+        self.name = name
+        self.capacity = capacity
+        self.period = period
+        self.backend = InMemoryRateLimitBackend()
+
+    def init_app(self, app, config_prefix: str) -> None:
+        self.capacity = app.config.get(f"{config_prefix}_ATTEMPTS", self.capacity)
+        self.period = app.config.get(f"{config_prefix}_PERIOD", self.period)
+        redis_url = app.config.get("RATE_LIMIT_REDIS_URL")
+        if redis_url:
+            self.backend = RedisRateLimitBackend.from_url(redis_url)
+
+    def hit(self, key: str) -> float:
+        """ Record an attempt for `key`; returns 0 if it is allowed, otherwise the seconds to wait. """
+        return self.backend.take(f"{self.name}:{key}", self.capacity, self.capacity / self.period)
+
+
+login_limiter_by_ip = RateLimiter("login_ip", capacity=20, period=60)
+login_limiter_by_username = RateLimiter("login_username", capacity=5, period=60)
+
+
+def init_app(app) -> None:
+    login_limiter_by_ip.init_app(app, "LOGIN_RATE_LIMIT_IP")
+    login_limiter_by_username.init_app(app, "LOGIN_RATE_LIMIT_USERNAME")
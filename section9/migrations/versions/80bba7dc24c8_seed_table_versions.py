@@ -0,0 +1,32 @@
+"""Seed table_versions, so that bumping a counter never has to insert its row.
+
+Revision ID: 80bba7dc24c8
+Revises: 08745b2b781b
+Create Date: 2026-10-17 23:41:12.318205
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '80bba7dc24c8'
+down_revision = '08745b2b781b'
+branch_labels = None
+depends_on = None
+
+VERSIONED_TABLES = ('items', 'stores')
+
+
+def upgrade():
+    table_versions = sa.table('table_versions', sa.column('name', sa.String), sa.column('version', sa.Integer))
+    bind = op.get_bind()
+    existing = {name for (name,) in bind.execute(sa.select(table_versions.c.name))}
+    # a missing row reads as version 0 (see libs.etag), so seeding at 0 leaves the ETags as they were
+    op.bulk_insert(table_versions, [
+        {'name': name, 'version': 0} for name in VERSIONED_TABLES if name not in existing
+    ])
+
+
+def downgrade():
+    pass  # the rows are harmless, and deleting them would hand out old ETags again
@@ -1,6 +1,15 @@
-from typing import List
+from typing import Dict, Iterable, Iterator, List, Optional, Set
 
-from db import db
+from sqlalchemy import inspect
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from db import db, commit, invalidate_on_commit
+from libs.cache import item_cache, store_cache
+from models.store import StoreModel
+from models.table_version import TableVersionModel
+
+UPSERT_INSERTS = {"postgresql": postgresql_insert, "sqlite": sqlite_insert}
 
 
 class ItemModel(db.Model):
@@ -10,7 +19,7 @@ class ItemModel(db.Model):
     name = db.Column(db.String(80), nullable=False, unique=True)
     price = db.Column(db.Float(precision=2), nullable=False)
 
-    store_id = db.Column(db.Integer, db.ForeignKey("stores.id"), nullable=False)
+    store_id = db.Column(db.Integer, db.ForeignKey("stores.id"), nullable=False, index=True)  # StoreModel.items
     store = db.relationship("StoreModel", back_populates="items")
 
     @classmethod
@@ -21,14 +30,110 @@ class ItemModel(db.Model):
     def find_by_id(cls, _id: int) -> "ItemModel":
         return cls.query.filter_by(id=_id).first()
 
+    @classmethod
+    def find_by_ids(cls, ids: Iterable[int]) -> Dict[int, "ItemModel"]:
+        """
+        Fetch many items with a single SELECT ... WHERE id IN (...). Ids that do not exist are absent from the result.
+        """
+        return {item.id: item for item in cls.query.filter(cls.id.in_(set(ids))).all()}
+
     @classmethod
     def find_all(cls) -> List["ItemModel"]:
         return cls.query.all()
 
+    @classmethod
+    def find_page(cls, limit: int, after: int = 0) -> List["ItemModel"]:
+        """
+        Keyset pagination on the primary key: WHERE id > after ORDER BY id LIMIT limit.
+        The cost of a page does not depend on how deep into the table it is.
+        """
+        return cls.query.filter(cls.id > after).order_by(cls.id).limit(limit).all()
+
+    @classmethod
+    def iter_row_batches(cls, batch_size: int) -> Iterator[List[dict]]:
+        """
+        Yield every item as a plain dict of its columns, in id order and `batch_size` at a time, from a server-side
+        cursor. Skips building ORM objects, which is most of the cost of exporting the whole table.
+        """
+        with db.engine.connect() as connection:  # its own connection, so the cursor can stream
+            result = connection.execution_options(stream_results=True).execute(cls.__table__.select().order_by(cls.id))
+            for rows in result.mappings().partitions(batch_size):
+                yield [dict(row) for row in rows]
+
+    @classmethod
+    def find_existing_names(cls, names: Iterable[str]) -> Set[str]:
+        return {name for (name,) in db.session.query(cls.name).filter(cls.name.in_(set(names)))}
+
+    @classmethod
+    def bulk_insert(cls, rows: List[dict]) -> None:
+        """
+        Insert many already validated rows with a single executemany INSERT, committed as one transaction.
+        """
+        db.session.execute(cls.__table__.insert(), rows)
+        TableVersionModel.bump(cls.__tablename__)
+        store_ids = {row["store_id"] for row in rows}
+        for (store_name,) in db.session.query(StoreModel.name).filter(StoreModel.id.in_(store_ids)):
+            invalidate_on_commit(store_cache, store_name)
+        commit()
+
+    @classmethod
+    def upsert(cls, name: str, price: float, store_id: Optional[int] = None) -> Optional[dict]:
+        """
+        Create the item, or set the price of the existing item with that name, atomically:
+        INSERT ... ON CONFLICT (name) DO UPDATE SET price = excluded.price. Two concurrent calls for the same name
+        cannot both try to insert it.
+        Without `store_id` the item can only be updated, and None is returned if it does not exist.
+        Returns the item's columns as they are after the write.
+        Databases other than PostgreSQL and SQLite get a SELECT then an INSERT or UPDATE instead, where two concurrent
+        calls creating the same item may still both insert it, and one fail on the unique name.
+        """
+        table = cls.__table__
+        dialect = db.engine.dialect
+        update = table.update().where(table.c.name == name).values(price=price)
+        if store_id is None:
+            statement = update
+        elif dialect.name in UPSERT_INSERTS:
+            insert = UPSERT_INSERTS[dialect.name](table).values(name=name, price=price, store_id=store_id)
+            statement = insert.on_conflict_do_update(
+                index_elements=[table.c.name], set_={"price": insert.excluded.price}
+            )
+        elif cls.find_by_name(name):
+            statement = update
+        else:
+            statement = table.insert().values(name=name, price=price, store_id=store_id)
+
+        if getattr(dialect, "insert_returning", dialect.name == "postgresql"):
+            row = db.session.execute(statement.returning(*table.c)).mappings().first()
+        else:  # SQLite before SQLAlchemy 2.0: read the row back inside the same transaction
+            db.session.execute(statement)
+            row = db.session.execute(table.select().where(table.c.name == name)).mappings().first()
+
+        if row is None:
+            return None
+
+        TableVersionModel.bump(cls.__tablename__)
+        invalidate_on_commit(item_cache, name)
+        for (store_name,) in db.session.query(StoreModel.name).filter_by(id=row["store_id"]):
+            invalidate_on_commit(store_cache, store_name)
+        row = dict(row)
+        commit()
+        return row
+
+    def _invalidate_cached(self) -> None:
+        """ Forget this item's cached payload, and those of the stores that list it (before and after a move). """
+        store_ids = {self.store_id, *inspect(self).attrs.store_id.history.deleted}
+        invalidate_on_commit(item_cache, self.name)
+        for (store_name,) in db.session.query(StoreModel.name).filter(StoreModel.id.in_(store_ids)):
+            invalidate_on_commit(store_cache, store_name)
+
     def save_to_db(self) -> None:
+        self._invalidate_cached()
+        TableVersionModel.bump(self.__tablename__)
         db.session.add(self)
-        db.session.commit()
+        commit()
 
     def delete_from_db(self) -> None:
+        self._invalidate_cached()
+        TableVersionModel.bump(self.__tablename__)
         db.session.delete(self)
-        db.session.commit()
+        commit()
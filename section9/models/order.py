@@ -1,8 +1,12 @@
 import os
 import stripe
 
-from db import db
-from typing import List
+from db import db, commit
+from decimal import Decimal, ROUND_HALF_UP
+from typing import List, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from models.item import ItemModel
 
 CURRENCY = "usd"
 
@@ -11,13 +15,34 @@ class ItemsInOrder(db.Model):
     __tablename__ = "items_in_order"
 
     id = db.Column(db.Integer, primary_key=True)
-    item_id = db.Column(db.Integer, db.ForeignKey("items.id"))
-    order_id = db.Column(db.Integer, db.ForeignKey("orders.id"))
+    item_id = db.Column(db.Integer, db.ForeignKey("items.id"), index=True)
+    order_id = db.Column(db.Integer, db.ForeignKey("orders.id"), index=True)  # OrderModel.items
     quantity = db.Column(db.Integer)
+    # Snapshot of the item at the time of the order, so totals never need to load the item again.
+    item_name = db.Column(db.String(80), nullable=False)
+    unit_price_cents = db.Column(db.Integer, nullable=False)
 
     item = db.relationship("ItemModel")
     order = db.relationship("OrderModel", back_populates="items")
 
+    @classmethod
+    def from_item(cls, item: "ItemModel", quantity: int) -> "ItemsInOrder":
+        return cls(
+            item_id=item.id,
+            quantity=quantity,
+            item_name=item.name,
+            unit_price_cents=cls.to_cents(item.price),  # rounded once here instead of on every sum
+        )
+
+    @staticmethod
+    def to_cents(price: float) -> int:
+        """ 29.95 -> 2995. Through the price's decimal digits, as 0.285 * 100 is 28.499999999999996 in floats. """
+        return int((Decimal(str(price)) * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+    @property
+    def total_cents(self) -> int:
+        return self.unit_price_cents * self.quantity
+
 
 # [item_id, order_id]
 # [1, 3]
@@ -29,22 +54,26 @@ class OrderModel(db.Model):
     __tablename__ = "orders"
 
     id = db.Column(db.Integer, primary_key=True)
-    status = db.Column(db.String(20), nullable=False)
+    status = db.Column(db.String(20), nullable=False, index=True)
+    amount_cents = db.Column(db.Integer, nullable=False)
 
     items = db.relationship("ItemsInOrder", back_populates="order")  # self.items[0..x].item
 
+    def __init__(self, items: List[ItemsInOrder], **kwargs):
+        super().__init__(items=items, **kwargs)
+        self.amount_cents = sum(item_data.total_cents for item_data in items)
+
     @property
     def description(self):
         """
         Generate a simple string representing this order, in the format of "5x chair, 2x table"
         """
-        item_counts = [f"{i.quantity}x {i.item.name}" for i in self.items]
+        item_counts = [f"{i.quantity}x {i.item_name}" for i in self.items]
         return ",".join(item_counts)
 
     @property
     def amount(self):
-        #  sum is 29.95 -> * 100 -> 2995 -> int(2995)
-        return int(sum([item_data.item.price * item_data.quantity for item_data in self.items]) * 100)
+        return self.amount_cents
 
     @classmethod
     def find_all(cls) -> List["OrderModel"]:
@@ -70,8 +99,8 @@ class OrderModel(db.Model):
 
     def save_to_db(self) -> None:
         db.session.add(self)
-        db.session.commit()
+        commit()
 
     def delete_to_db(self) -> None:
         db.session.delete(self)
-        db.session.commit()
+        commit()
@@ -1,6 +1,10 @@
-from typing import List
+from typing import Iterable, List, Set
 
-from db import db
+from sqlalchemy.orm import selectinload
+
+from db import db, commit, invalidate_on_commit
+from libs.cache import store_cache
+from models.table_version import TableVersionModel
 
 
 class StoreModel(db.Model):
@@ -9,20 +13,41 @@ class StoreModel(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(80), nullable=False, unique=True)
 
-    items = db.relationship("ItemModel", lazy="dynamic")
+    # A plain list relationship (instead of lazy="dynamic") so that the items can be eager-loaded with the store.
+    items = db.relationship("ItemModel", back_populates="store")
 
     @classmethod
     def find_by_name(cls, name: str) -> "StoreModel":
         return cls.query.filter_by(name=name).first()
 
+    @classmethod
+    def find_by_name_with_items(cls, name: str) -> "StoreModel":
+        return cls.query.options(selectinload(cls.items)).filter_by(name=name).first()
+
+    @classmethod
+    def find_existing_ids(cls, ids: Iterable[int]) -> Set[int]:
+        return {_id for (_id,) in db.session.query(cls.id).filter(cls.id.in_(set(ids)))}
+
     @classmethod
     def find_all(cls) -> List["StoreModel"]:
         return cls.query.all()
 
+    @classmethod
+    def find_all_with_items(cls) -> List["StoreModel"]:
+        """
+        Load every store and all of their items in two queries, however many stores there are:
+        SELECT * FROM stores, then SELECT * FROM items WHERE store_id IN (...).
+        """
+        return cls.query.options(selectinload(cls.items)).all()
+
     def save_to_db(self) -> None:
+        invalidate_on_commit(store_cache, self.name)
+        TableVersionModel.bump(self.__tablename__)
         db.session.add(self)
-        db.session.commit()
+        commit()
 
     def delete_from_db(self) -> None:
+        invalidate_on_commit(store_cache, self.name)
+        TableVersionModel.bump(self.__tablename__)
         db.session.delete(self)
-        db.session.commit()
+        commit()
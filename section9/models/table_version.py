@@ -0,0 +1,29 @@
+from typing import Dict, Iterable
+
+from db import db
+
+
+class TableVersionModel(db.Model):
+    """
+    One row per catalogue table, with a counter bumped in the same transaction as every write to that table.
+    Reading the counters is a single primary key lookup, which makes them cheap to turn into ETags.
+    """
+    __tablename__ = "table_versions"
+
+    name = db.Column(db.String(80), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+    @classmethod
+    def find_versions(cls, names: Iterable[str]) -> Dict[str, int]:
+        return {row.name: row.version for row in cls.query.filter(cls.name.in_(list(names)))}
+
+    @classmethod
+    def bump(cls, name: str) -> None:
+        """
+        Increment the counter of `name`; committed together with the write that called it.
+        The rows are created by a migration, so this is a single UPDATE; the INSERT is only for a table without one,
+        where two transactions writing to it for the first time could both try it, and one fail on the primary key.
+        """
+        updated = cls.query.filter_by(name=name).update({cls.version: cls.version + 1}, synchronize_session=False)
+        if not updated:
+            db.session.add(cls(name=name, version=1))
@@ -1,4 +1,4 @@
-from db import db
+from db import db, commit
 
 
 class UserModel(db.Model):
@@ -6,7 +6,7 @@ class UserModel(db.Model):
 
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), nullable=False, unique=True)
-    password = db.Column(db.String(80), nullable=False)
+    password = db.Column(db.String(255), nullable=False)  # see libs.passwords
 
     @classmethod
     def find_by_username(cls, username: str) -> "UserModel":
@@ -18,8 +18,8 @@ class UserModel(db.Model):
 
     def save_to_db(self) -> None:
         db.session.add(self)
-        db.session.commit()
+        commit()
 
     def delete_from_db(self) -> None:
         db.session.delete(self)
-        db.session.commit()
+        commit()
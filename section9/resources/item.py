@@ -1,22 +1,51 @@
+import csv
+import io
+import json
+from itertools import islice
+
 from flask_restful import Resource
-from flask import request
+from flask import Response, request, stream_with_context
 from flask_jwt_extended import jwt_required
+from libs.cache import item_cache
+from libs.etag import catalogue_etag, etag_headers, is_not_modified, not_modified_response
+from marshmallow import ValidationError
 from models.item import ItemModel
+from models.store import StoreModel
 from schemas.item import ItemSchema
 from libs.strings import gettext
 
 item_schema = ItemSchema()
 item_list_schema = ItemSchema(many=True)
+item_row_schema = ItemSchema(load_instance=False)  # validates and converts a row, without building an ItemModel
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+STREAM_BATCH_SIZE = 500
+IMPORT_CHUNK_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+
+CSV_MIMETYPE = "text/csv"
+NDJSON_MIMETYPE = "application/x-ndjson"
+EXPORT_COLUMNS = ("id", "name", "price", "store_id")
 
 
 class Item(Resource):
     @classmethod
     def get(cls, name: str):
-        item = ItemModel.find_by_name(name)
-        if item:
-            return item_schema.dump(item), 200
+        etag = catalogue_etag(ItemModel.__tablename__)
+        if is_not_modified(etag):
+            return not_modified_response(etag)
 
-        return {"message": gettext("item_not_found")}, 404
+        # after_commit only clears this process's cache: an entry cached under an older version is stale
+        cached_etag, payload = item_cache.get(name) or (None, None)
+        if cached_etag != etag:
+            item = ItemModel.find_by_name(name)
+            if not item:
+                return {"message": gettext("item_not_found")}, 404
+            payload = item_schema.dump(item)
+            item_cache.set(name, (etag, payload))
+
+        return payload, 200, etag_headers(etag)
 
     @classmethod
     @jwt_required(fresh=True)
@@ -49,15 +78,12 @@ class Item(Resource):
     @classmethod
     def put(cls, name: str):
         item_json = request.get_json()
-        item = ItemModel.find_by_name(name)
-
-        if item:
-            item.price = item_json["price"]
-        else:
-            item_json["name"] = name
-            item = item_schema.load(item_json)
+        item_json["name"] = name
+        item_data = item_row_schema.load(item_json, partial=("store_id",))  # store_id is only needed to create one
 
-        item.save_to_db()
+        item = ItemModel.upsert(name, item_data["price"], item_data.get("store_id"))
+        if item is None:
+            raise ValidationError({"store_id": [gettext("item_store_id_required")]})
 
         return item_schema.dump(item), 200
 
@@ -65,4 +91,141 @@ class Item(Resource):
 class ItemList(Resource):
     @classmethod
     def get(cls):
-        return {"items": item_list_schema.dump(ItemModel.find_all())}, 200
\ No newline at end of file
+        """
+        Return one page of items, ordered by id. `?limit=` sets the page size and `?after=` is the last id of the
+        previous page (the `next` value of the previous response).
+        With `?stream=1` the whole table is sent as NDJSON, one item per line.
+        """
+        etag = catalogue_etag(ItemModel.__tablename__)
+        if is_not_modified(etag):
+            return not_modified_response(etag)
+
+        if request.args.get("stream") in ("1", "true"):
+            return _export_response("ndjson", etag)
+
+        limit = request.args.get("limit", DEFAULT_PAGE_SIZE, type=int)
+        after = request.args.get("after", 0, type=int)
+        if not 0 < limit <= MAX_PAGE_SIZE or after < 0:
+            return {"message": gettext("item_invalid_pagination").format(MAX_PAGE_SIZE)}, 400
+
+        items = ItemModel.find_page(limit, after)
+        next_after = items[-1].id if len(items) == limit else None
+        return {"items": item_list_schema.dump(items), "next": next_after}, 200, etag_headers(etag)
+
+
+class ItemExport(Resource):
+    @classmethod
+    def get(cls):
+        """ Stream the whole items table as `?format=ndjson` (the default) or `?format=csv`. """
+        export_format = request.args.get("format", "ndjson")
+        if export_format not in ("csv", "ndjson"):
+            return {"message": gettext("item_bulk_unsupported_format").format(export_format)}, 400
+
+        etag = catalogue_etag(ItemModel.__tablename__)
+        if is_not_modified(etag):
+            return not_modified_response(etag)
+
+        return _export_response(export_format, etag)
+
+
+class ItemImport(Resource):
+    @classmethod
+    @jwt_required(fresh=True)
+    def post(cls):
+        """
+        Create many items from a CSV (with a `name,price,store_id` header) or NDJSON request body.
+        The body is read as a stream and inserted in chunks of IMPORT_CHUNK_SIZE rows, each chunk in one transaction.
+        Invalid rows are skipped and reported by their 1-based row number; the valid ones are still inserted.
+        """
+        if request.mimetype == CSV_MIMETYPE:
+            rows = _read_csv_rows()
+        elif request.mimetype == NDJSON_MIMETYPE:
+            rows = _read_ndjson_rows()
+        else:
+            return {"message": gettext("item_bulk_unsupported_format").format(request.mimetype)}, 415
+
+        inserted = 0
+        errors = []
+        error_count = 0
+        numbered_rows = enumerate(rows, start=1)
+        while True:
+            chunk = list(islice(numbered_rows, IMPORT_CHUNK_SIZE))
+            if not chunk:
+                break
+
+            valid_rows, chunk_errors = _validate_chunk(chunk)
+            if valid_rows:
+                ItemModel.bulk_insert(valid_rows)
+                inserted += len(valid_rows)
+            error_count += len(chunk_errors)
+            errors.extend(chunk_errors[:MAX_REPORTED_ERRORS - len(errors)])
+
+        return {"inserted": inserted, "error_count": error_count, "errors": errors}, 200
+
+
+def _request_lines():
+    return (line.decode("utf-8") for line in request.stream)
+
+
+def _read_csv_rows():
+    return csv.DictReader(_request_lines())
+
+
+def _read_ndjson_rows():
+    for line in _request_lines():
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield None  # rejected by the schema as an invalid row
+
+
+def _validate_chunk(chunk):
+    """ Return the chunk's insertable rows, and an error report for each of the others. """
+    loaded = []
+    errors = []
+    for number, row in chunk:
+        if isinstance(row, dict):
+            row.pop("id", None)  # in every exported row, but the database gives each new item its own
+        try:
+            loaded.append((number, item_row_schema.load(row)))
+        except ValidationError as err:
+            errors.append({"row": number, "errors": err.messages})
+
+    existing_names = ItemModel.find_existing_names(row["name"] for _, row in loaded)
+    existing_store_ids = StoreModel.find_existing_ids(row["store_id"] for _, row in loaded)
+    valid_rows = []
+    for number, row in loaded:
+        if row["name"] in existing_names:
+            errors.append({"row": number, "errors": {"name": [gettext("item_name_exists").format(row["name"])]}})
+        elif row["store_id"] not in existing_store_ids:
+            message = gettext("item_store_not_found").format(row["store_id"])
+            errors.append({"row": number, "errors": {"store_id": [message]}})
+        else:
+            existing_names.add(row["name"])  # a repeated name later in the same chunk is an error too
+            valid_rows.append(row)
+
+    errors.sort(key=lambda error: error["row"])
+    return valid_rows, errors
+
+
+def _export_response(export_format: str, etag: str) -> Response:
+    def generate_ndjson():
+        for rows in ItemModel.iter_row_batches(STREAM_BATCH_SIZE):
+            yield "".join(json.dumps(row) + "\n" for row in rows)
+
+    def generate_csv():
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS)
+        writer.writeheader()
+        for rows in ItemModel.iter_row_batches(STREAM_BATCH_SIZE):
+            writer.writerows(rows)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue()
+
+    if export_format == "csv":
+        return Response(stream_with_context(generate_csv()), mimetype=CSV_MIMETYPE, headers=etag_headers(etag))
+    return Response(stream_with_context(generate_ndjson()), mimetype=NDJSON_MIMETYPE, headers=etag_headers(etag))
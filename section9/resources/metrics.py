@@ -0,0 +1,22 @@
+from flask_restful import Resource
+
+from blocklist import BLOCKLIST
+from db import db
+from libs.cache import item_cache, store_cache
+from libs.pool_metrics import pool_metrics
+
+
+class Metrics(Resource):
+    """
+    Internal only: live statistics about the connection pool, the catalogue caches and the JWT blocklist.
+    Only registered when INTERNAL_METRICS_ENABLED is set in the app config.
+    """
+
+    @classmethod
+    def get(cls):
+        return {
+            "db_pool": pool_metrics.snapshot(db.engine.pool),
+            "item_cache": item_cache.stats(),
+            "store_cache": store_cache.stats(),
+            "blocklist": BLOCKLIST.stats(),
+        }, 200
@@ -3,6 +3,7 @@ from flask import request
 from flask_restful import Resource
 from stripe import error
 
+from db import unit_of_work
 from libs.strings import gettext
 from models.item import ItemModel
 from models.order import OrderModel, ItemsInOrder
@@ -27,21 +28,22 @@ class Order(Resource):
         items = []
         item_id_quantities = Counter(data["item_ids"])
 
-#         Iterate over items and retrieve them from the database.
+        # Retrieve all the items from the database in one query, then iterate over them.
+        items_by_id = ItemModel.find_by_ids(item_id_quantities.keys())
         for _id, count in item_id_quantities.most_common():  # [(5, 3), (3, 1), (2, 1), (1, 1)]
-            item = ItemModel.find_by_id(_id)
+            item = items_by_id.get(_id)
             if not item:
                 return {"message": gettext("order_item_by_id_not_found").format(_id)}, 404
 
-            items.append(ItemsInOrder(item_id=_id, quantity=count))
+            items.append(ItemsInOrder.from_item(item, count))
 
         order = OrderModel(items=items, status="pending")
-        order.save_to_db()  # this does not submit to Stripe
+        order.save_to_db()  # first commit, this does not submit to Stripe
 
         try:
-            order.set_status("failed")  # assume the order would fail until it's completed
-            order.charge_with_stripe(data["token"])
-            order.set_status("complete")  # charge succeeded
+            with unit_of_work():  # second commit, only if the charge succeeded; rolled back otherwise
+                order.charge_with_stripe(data["token"])
+                order.set_status("complete")  # charge succeeded
             return order_schema.dump(order), 200
             # the following error handling is advised by Stripe, although the handling implementations are identical,
             # we choose to specify them separately just to give the students a better idea what we can expect
@@ -69,3 +71,6 @@ class Order(Resource):
             # Something else happened, completely unrelated to Stripe
             print(e)
             return {"message": gettext("order_error")}, 500
+        finally:
+            if order.status != "complete":
+                order.set_status("failed")  # second commit when the order did not go through
@@ -1,4 +1,7 @@
 from flask_restful import Resource
+from libs.cache import store_cache
+from libs.etag import catalogue_etag, etag_headers, is_not_modified, not_modified_response
+from models.item import ItemModel
 from models.store import StoreModel
 from schemas.store import StoreSchema
 from libs.strings import gettext
@@ -10,11 +13,20 @@ store_list_schema = StoreSchema(many=True)
 class Store(Resource):
     @classmethod
     def get(cls, name: str):
-        store = StoreModel.find_by_name(name)
-        if store:
-            return store_schema.dump(store), 200
+        etag = catalogue_etag(StoreModel.__tablename__, ItemModel.__tablename__)  # a store's payload lists its items
+        if is_not_modified(etag):
+            return not_modified_response(etag)
 
-        return {"message": gettext("store_not_found")}, 404
+        # after_commit only clears this process's cache: an entry cached under an older version is stale
+        cached_etag, payload = store_cache.get(name) or (None, None)
+        if cached_etag != etag:
+            store = StoreModel.find_by_name_with_items(name)
+            if not store:
+                return {"message": gettext("store_not_found")}, 404
+            payload = store_schema.dump(store)
+            store_cache.set(name, (etag, payload))
+
+        return payload, 200, etag_headers(etag)
 
     @classmethod
     def post(cls, name: str):
@@ -42,4 +54,8 @@ class Store(Resource):
 class StoreList(Resource):
     @classmethod
     def get(cls):
-        return {"stores": store_list_schema.dump(StoreModel.find_all())}, 200
\ No newline at end of file
+        etag = catalogue_etag(StoreModel.__tablename__, ItemModel.__tablename__)
+        if is_not_modified(etag):
+            return not_modified_response(etag)
+
+        return {"stores": store_list_schema.dump(StoreModel.find_all_with_items())}, 200, etag_headers(etag)
\ No newline at end of file
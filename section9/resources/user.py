@@ -1,6 +1,7 @@
+import math
+
 from flask_restful import Resource
 from flask import request
-from hmac import compare_digest
 from flask_jwt_extended import (
     create_access_token,
     create_refresh_token,
@@ -11,6 +12,7 @@ from flask_jwt_extended import (
 from models.user import UserModel
 from schemas.user import UserSchema
 from blocklist import BLOCKLIST
+from libs import passwords, rate_limit
 from libs.strings import gettext
 
 user_schema = UserSchema()
@@ -25,6 +27,10 @@ class UserRegister(Resource):
         if UserModel.find_by_username(user.username):
             return {"message": gettext("user_username_exists")}, 400
 
+        try:
+            user.password = passwords.hash_password_in_pool(user.password)
+        except passwords.PasswordPoolBusy:
+            return {"message": gettext("user_register_server_busy")}, 503, {"Retry-After": "1"}
         user.save_to_db()
 
         return {"message": gettext("user_registered")}, 201
@@ -60,9 +66,28 @@ class UserLogin(Resource):
         user_json = request.get_json()
         user_data = user_schema.load(user_json)
 
+        # Throttle before touching the database, so a credential stuffing run cannot tie up its connections.
+        retry_after = max(
+            rate_limit.login_limiter_by_ip.hit(request.remote_addr),
+            rate_limit.login_limiter_by_username.hit(user_data.username),
+        )
+        if retry_after:
+            return {"message": gettext("user_too_many_attempts")}, 429, {"Retry-After": str(math.ceil(retry_after))}
+
         user = UserModel.find_by_username(user_data.username)
 
-        if user and compare_digest(user.password, user_data.password):
+        try:
+            valid = passwords.verify_password_in_pool(user_data.password, user.password if user else None)
+        except passwords.PasswordPoolBusy:
+            return {"message": gettext("user_server_busy")}, 503, {"Retry-After": "1"}
+
+        if valid:
+            if passwords.needs_rehash(user.password):  # stored in plaintext, or with an older cost
+                try:
+                    user.password = passwords.hash_password_in_pool(user_data.password)
+                    user.save_to_db()
+                except passwords.PasswordPoolBusy:
+                    pass  # the login is still valid, rehash next time
             access_token = create_access_token(identity=user.id, fresh=True)
             refresh_token = create_refresh_token(user.id)
             return {"access_token": access_token, "refresh_token": refresh_token}, 200
@@ -74,9 +99,10 @@ class UserLogout(Resource):
     @classmethod
     @jwt_required()
     def post(cls):
-        jti = get_jwt()["jti"]  # jti is "JWT ID", a unique identifier for a JWT.
+        jwt = get_jwt()
+        jti = jwt["jti"]  # jti is "JWT ID", a unique identifier for a JWT.
         user_id = get_jwt_identity()
-        BLOCKLIST.add(jti)
+        BLOCKLIST.add(jti, jwt["exp"])
         return {"message": gettext("user_logged_out").format(user_id)}, 200
 
 
@@ -6,5 +6,5 @@ class OrderSchema(ma.SQLAlchemyAutoSchema):
     class Meta:
         model = OrderModel
         load_only = ("token",)
-        dump_only = ("id", "status",)
+        dump_only = ("id", "status", "amount_cents",)
 